@@ -0,0 +1,103 @@
+"""
+Loader benchmark on a synthetic 10-year, 50-flat CSV: the vectorized build_tables against the former
+per-row loader (strptime per value, table scan per source id, iterrows over the bookings per calendar day).
+The former calendar builder is timed on one flat and multiplied by the number of flats (flats are independent),
+running it on the whole file takes about five minutes
+
+    python benchmark.py [years] [flats]
+"""
+import datetime as dt
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from main import DATE_FORMAT, COLUMNS, FLAT_COLUMN, build_tables
+
+SOURCES = ['Avito', 'Airbnb', 'Booking', 'Cian', 'Суточно']
+
+
+def generate_csv(path, years, flats, today):
+    rnd = random.Random(17)
+    rows = []
+    start = today - dt.timedelta(days=365 * years)
+    end = today + dt.timedelta(days=365)
+    for k in range(1, flats + 1):
+        day = start
+        while day < end:
+            nights = rnd.randint(1, 14)
+            checkout = day + dt.timedelta(days=nights)
+            status = 3 if rnd.random() < 0.1 else (1 if checkout <= today else 2)
+            rows.append([f'Гость {len(rows)}', f'7900{len(rows):07d}', rnd.choice(SOURCES),
+                         day.strftime(DATE_FORMAT), checkout.strftime(DATE_FORMAT), 2500 * nights, 2500, status,
+                         (day - dt.timedelta(days=rnd.randint(0, 60))).strftime(DATE_FORMAT), f'Квартира {k}'])
+            if status != 3:
+                day = checkout + dt.timedelta(days=rnd.randint(0, 5))
+    pd.DataFrame(rows, columns=COLUMNS + [FLAT_COLUMN]).to_csv(path, index=False, encoding='utf-16')
+    return start
+
+
+# former loader
+
+def replace_value_by_ind(value, table_id):
+    if pd.notnull(value):
+        return table_id[table_id.iloc[:, 0] == value].index[0]
+    else:
+        return value
+
+
+def check_dates(day, dates, today):
+    if day < today:
+        return 0
+    else:
+        for index, row in dates.iterrows():
+            if day >= row['check-in_date'] and day < row['check-out_date']:
+                return 0
+    return 1
+
+
+def former_tables(init_df, start_date, end_date, today, flat_name):
+    dates = pd.DataFrame({'check-in_date': init_df['Заезд'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date()),
+                          'check-out_date': init_df['Выезд'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date())})
+    source = pd.DataFrame(init_df['Сайт']).dropna().drop_duplicates().reset_index(drop=True)
+    source.index += 1
+    id_source = init_df['Сайт'].apply(lambda x: replace_value_by_ind(x, source))
+    flat_dates = dates[init_df[FLAT_COLUMN] == flat_name]
+    start = time.perf_counter()
+    cal = pd.DataFrame({'Dates': pd.date_range(start_date, end_date).strftime('%d.%m.%Y')})
+    cal['Dates'] = cal['Dates'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date())
+    is_available = cal['Dates'].apply(lambda x: check_dates(x, flat_dates, today))
+    return id_source, is_available, time.perf_counter() - start
+
+
+def main(years=10, flats=50):
+    today = dt.date.today()
+    end_date = today + dt.timedelta(days=365)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'init_data_for_db.csv')
+        start_date = generate_csv(path, years, flats, today)
+        init_df = pd.read_csv(path, encoding='utf-16')
+    print(f'{years} years, {flats} flats, {len(init_df)} bookings, '
+          f'{(end_date - start_date).days + 1} calendar days per flat')
+
+    start = time.perf_counter()
+    tables = build_tables(init_df, start_date, end_date, today)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    id_source, is_available, calendar_time = former_tables(init_df, start_date, end_date, today, 'Квартира 1')
+    former = time.perf_counter() - start - calendar_time + calendar_time * flats
+
+    calendar = tables['calendar']
+    assert (tables['booking']['id_source'].to_numpy() == id_source.to_numpy()).all()
+    assert (calendar[calendar['id_flat'] == 1]['is_available'].to_numpy() == is_available.to_numpy()).all()
+    print(f'former loader:     {former:9.1f} s (calendar of one flat {calendar_time:.1f} s x {flats})')
+    print(f'vectorized loader: {vectorized:9.2f} s')
+    print(f'speed-up:          {former / vectorized:9.0f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,25 +1,27 @@
 import pandas as pd
+import numpy as np
 import datetime as dt
-import change_data as cd
 
 PATH_TO_CSV = f'./data/init_data_for_db.csv'
 DATE_FORMAT = '%d.%m.%Y'
+COLUMNS = ['Имя', 'Телефон', 'Сайт', 'Заезд', 'Выезд', 'Сумма', 'Базовая цена', 'Статус', 'Дата']
+# optional column with the name of the flat, the whole file belongs to one flat without it
+FLAT_COLUMN = 'Объект'
+CALENDAR_START = dt.datetime(2022, 4, 17)
 
-data = pd.read_csv(PATH_TO_CSV, encoding='utf-16')
-init_df = pd.DataFrame(data, columns=['Имя', 'Телефон', 'Сайт',
-                                      'Заезд', 'Выезд', 'Сумма',
-                                      'Базовая цена', 'Статус', 'Дата'])
 
-dates = pd.DataFrame({'check-in_date': init_df['Заезд'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date()),
-                      'check-out_date': init_df['Выезд'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date())})
+def read_bookings(path):
+    import change_data as cd
 
-init_df['Телефон'] = cd.change_phone(init_df['Телефон'])
+    data = pd.read_csv(path, encoding='utf-16')
+    columns = COLUMNS + [FLAT_COLUMN] if FLAT_COLUMN in data.columns else COLUMNS
+    init_df = pd.DataFrame(data, columns=columns)
+    init_df['Телефон'] = cd.change_phone(init_df['Телефон'])
+    return init_df
 
-def replace_value_by_ind(value, table_id):
-    if pd.notnull(value):
-        return table_id[table_id.iloc[:, 0] == value].index[0]
-    else:
-        return value
+
+def to_dates(column):
+    return pd.to_datetime(column, format=DATE_FORMAT).dt.date
 
 
 def table_of_uniques(df, col_name):
@@ -29,104 +31,135 @@ def table_of_uniques(df, col_name):
     return df1
 
 
-def check_dates(day):
-    # day = dt.datetime.strptime(day, DATE_FORMAT).date()
-    if day < dt.date.today():
-        return 0
+def ids_by_value(table):
+    # value -> id of the table of uniques, replaces the search of every value in the table
+    return dict(zip(table.iloc[:, 0], table.index))
+
+
+def available_days(days, flats, checkin, checkout, booking_flats, today):
+    """
+    Availability of the calendar days: 0 if the day is in the past or is covered by a booking of the flat,
+    1 otherwise. The coverage is counted with a difference array over the (flat, day) grid:
+    +1 on the check-in day, -1 on the check-out day, cumulative sum > 0 - booked.
+
+    days: DatetimeIndex of the calendar days (consecutive)
+    flats: ids of the flats of the calendar, the calendar is len(flats) blocks of len(days) rows
+    checkin, checkout, booking_flats: arrays of the bookings
+    """
+    first = days[0].to_datetime64().astype('datetime64[D]')
+    n = len(days)
+    block = {flat: i for i, flat in enumerate(flats)}
+    offset = np.array([block[flat] for flat in booking_flats], dtype=np.int64) * (n + 1)
+    start = np.clip((np.asarray(checkin, dtype='datetime64[D]') - first).astype(np.int64), 0, n)
+    end = np.clip((np.asarray(checkout, dtype='datetime64[D]') - first).astype(np.int64), 0, n)
+    diff = np.zeros(len(flats) * (n + 1), dtype=np.int64)
+    np.add.at(diff, offset + start, 1)
+    np.add.at(diff, offset + end, -1)
+    booked = np.cumsum(diff.reshape(len(flats), n + 1), axis=1)[:, :n] > 0
+    past = days.date < today
+    return np.where(booked | past, 0, 1).ravel()
+
+
+def build_tables(init_df, start_date=CALENDAR_START, end_date=None, today=None):
+    today = today or dt.date.today()
+    end_date = end_date or today + dt.timedelta(days=365)
+    dates = pd.DataFrame({'check-in_date': to_dates(init_df['Заезд']),
+                          'check-out_date': to_dates(init_df['Выезд'])})
+
+    # source table
+    source = table_of_uniques(init_df, 'Сайт')
+
+    # tenant table
+    tenant = table_of_uniques(init_df, ['Телефон', 'Имя'])
+
+    # status table
+    status = pd.DataFrame({'name': ['Завершен', 'Ожидается', 'Отменен']})
+    status.index += 1
+
+    # flat table
+    if FLAT_COLUMN in init_df.columns:
+        flats = table_of_uniques(init_df, FLAT_COLUMN)
+        flat_names = list(flats.iloc[:, 0])
+        booking_flats = init_df[FLAT_COLUMN].map(ids_by_value(flats))
     else:
-        for index, row in dates.iterrows():
-            if day >= row['check-in_date'] and day < row['check-out_date']:
-                return 0
-    return 1
-
-
-# source table
-source = table_of_uniques(init_df, 'Сайт')
-
-# tenant table
-tenant = table_of_uniques(init_df, ['Телефон', 'Имя'])
-
-# status table
-status = pd.DataFrame({'name': ['Завершен', 'Ожидается', 'Отменен']})
-status.index += 1
-
-# booking table
-booking = pd.DataFrame({'id_flat': 1,
-                        'id_source': init_df['Сайт'].apply(lambda x: replace_value_by_ind(x, source)),
-                        'id_status': init_df['Статус'],
-                        'check-in_date': dates['check-in_date'],
-                        'check-out_date': dates['check-out_date'],
-                        'price': init_df['Сумма'],
-                        'booking_date': init_df['Дата'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date()),
-                        'discount': None,
-                        'comment': None})
-
-booking.index += 1
-
-# booking-tenant table
-booking_tenant = pd.DataFrame({'booking': range(1, 65),
-                               'phone': init_df['Телефон']})
-booking_tenant.index += 1
-
-print(booking_tenant)
-
-# calendar table
-start_date = dt.datetime(2022, 4, 17)
-end_date = dt.date.today() + dt.timedelta(days=365)
-cal = pd.DataFrame({'Dates': pd.date_range(start_date, end_date).strftime('%d.%m.%Y')})
-cal['Dates'] = cal['Dates'].apply(lambda x: dt.datetime.strptime(x, DATE_FORMAT).date())
-calendar = pd.DataFrame({'date': cal['Dates'],
-                         'id_flat': 1,
-                         'base_price': 2500,
-                         'min_nights_amount': 2,
-                         'is_available': cal['Dates'].apply(lambda x: check_dates(x))})
-
-# flat table
-flat = pd.DataFrame({'id_landlord': [1],
-                     'name': 'Rest&Calm',
-                     'address': 'St.Petersburg, Lenina str, 58, 12',
-                     'add_date': '2022-04-17',
-                     'edit_date': '2022-04-17',
-                     'link_sites': 'http/smth.ru',
-                     'link_tenants': 'http/smth.ru/user',
-                     'comment': None})
-flat.index += 1
-
-# flat-source table
-flat_source = pd.DataFrame({'id_flat': 1,
-                            'id_source': [1, 2, 3, 4, 5]})
-flat_source.index += 1
-
-# discount table
-discount = pd.DataFrame({'nights_amount': [7, 15, 30],
-                         'discount': [5, 7, 10]})
-discount.index += 1
-
-# flat-discount table
-flat_discount = pd.DataFrame({'id_flat': 1,
-                              'id_discount': [1, 2, 3]})
-flat_discount.index += 1
-
-# landlord table
-landlord = pd.DataFrame({'name': ['Ирина'],
-                         'e-mail': 'irina_studia@mail.ru',
-                         'password': '12345',
-                         'registration_date': '2022-04-17',
-                         'edit_date': '2022-04-17'})
-landlord.index += 1
+        flat_names = ['Rest&Calm']
+        booking_flats = pd.Series(1, index=init_df.index)
+    flat_ids = list(range(1, len(flat_names) + 1))
+    flat = pd.DataFrame({'id_landlord': 1,
+                         'name': flat_names,
+                         'address': 'St.Petersburg, Lenina str, 58, 12',
+                         'add_date': '2022-04-17',
+                         'edit_date': '2022-04-17',
+                         'link_sites': 'http/smth.ru',
+                         'link_tenants': 'http/smth.ru/user',
+                         'comment': None})
+    flat.index += 1
+
+    # booking table
+    booking = pd.DataFrame({'id_flat': booking_flats,
+                            'id_source': init_df['Сайт'].map(ids_by_value(source)),
+                            'id_status': init_df['Статус'],
+                            'check-in_date': dates['check-in_date'],
+                            'check-out_date': dates['check-out_date'],
+                            'price': init_df['Сумма'],
+                            'booking_date': to_dates(init_df['Дата']),
+                            'discount': None,
+                            'comment': None})
+
+    booking.index += 1
+
+    # booking-tenant table
+    booking_tenant = pd.DataFrame({'booking': range(1, len(init_df) + 1),
+                                   'phone': init_df['Телефон']})
+    booking_tenant.index += 1
+
+    # calendar table
+    days = pd.date_range(start_date, end_date)
+    calendar = pd.DataFrame({'date': np.tile(days.date, len(flat_ids)),
+                             'id_flat': np.repeat(flat_ids, len(days)),
+                             'base_price': 2500,
+                             'min_nights_amount': 2,
+                             'is_available': available_days(days, flat_ids, dates['check-in_date'],
+                                                            dates['check-out_date'], booking_flats, today)})
+
+    # flat-source table
+    flat_source = pd.DataFrame({'id_flat': np.repeat(flat_ids, len(source)),
+                                'id_source': np.tile(source.index, len(flat_ids))})
+    flat_source.index += 1
+
+    # discount table
+    discount = pd.DataFrame({'nights_amount': [7, 15, 30],
+                             'discount': [5, 7, 10]})
+    discount.index += 1
+
+    # flat-discount table
+    flat_discount = pd.DataFrame({'id_flat': np.repeat(flat_ids, len(discount)),
+                                  'id_discount': np.tile(discount.index, len(flat_ids))})
+    flat_discount.index += 1
+
+    # landlord table
+    landlord = pd.DataFrame({'name': ['Ирина'],
+                             'e-mail': 'irina_studia@mail.ru',
+                             'password': '12345',
+                             'registration_date': '2022-04-17',
+                             'edit_date': '2022-04-17'})
+    landlord.index += 1
+
+    return {'source': source,
+            'tenant': tenant,
+            'status': status,
+            'booking': booking,
+            'booking_tenant': booking_tenant,
+            'calendar': calendar,
+            'flat': flat,
+            'flat_source': flat_source,
+            'discount': discount,
+            'flat_discount': flat_discount,
+            'landlord': landlord}
+
 
 if __name__ == '__main__':
-    db_tables = {'source': source,
-                 'tenant': tenant,
-                 'status': status,
-                 'booking': booking,
-                 'booking_tenant': booking_tenant,
-                 'calendar': calendar,
-                 'flat': flat,
-                 'flat_source': flat_source,
-                 'discount': discount,
-                 'flat_discount': flat_discount,
-                 'landlord': landlord}
+    db_tables = build_tables(read_bookings(PATH_TO_CSV))
 
     for name, table in db_tables.items():
         table.fillna('\\N', inplace=True)
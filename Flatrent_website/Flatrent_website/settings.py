@@ -48,11 +48,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'booking.middleware.FlatContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,7 +63,7 @@ ROOT_URLCONF = 'Flatrent_website.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'booking.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -96,6 +98,17 @@ DATABASES = {
     },
 }
 
+# the cache is shared by all the worker processes: the versions of the owned flats, statistics and availability,
+# the price indexes and the public flats are dropped on every change, and a per-process cache would keep serving
+# the stale values in the other workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config.get('Redis', 'location', fallback='redis://127.0.0.1:6379/1'),
+        'KEY_PREFIX': 'flatrent',
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,6 +142,25 @@ USE_TZ = True
 
 DATE_FORMAT = "d-m-Y"
 
+# bookings checked out more than the given number of days ago are not exported to the .ics calendars
+ICAL_PAST_DAYS = 30
+
+# requests slower than the given number of ms are logged with their most repeated SQL statements
+SLOW_REQUEST_MS = 500
+# number of the last requests of every view used for the latency percentiles on the metrics page
+REQUEST_METRICS_SAMPLES = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'booking.metrics': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
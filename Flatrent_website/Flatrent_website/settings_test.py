@@ -0,0 +1,25 @@
+"""
+Settings for running the tests on SQLite:
+
+    python manage.py test --settings=Flatrent_website.settings_test
+"""
+
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_test.sqlite3',
+    },
+}
+
+# the first booking migrations describe the existing MySQL schema (managed=False) and can't build
+# an empty database, so the test database is created directly from the models
+MIGRATION_MODULES = {'booking': None}
+
+# the tests run in a single process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
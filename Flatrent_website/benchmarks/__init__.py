@@ -0,0 +1,34 @@
+"""
+Benchmarks of the booking app. They run on a temporary SQLite database created from the models,
+start them from the project directory:
+
+    python -m benchmarks.seeding
+"""
+import os
+import time
+
+
+def setup_django():
+    """
+           Configures Django with the test settings and creates an empty in-memory test database
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Flatrent_website.settings_test')
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def timeit(func, *args, repeat=3, **kwargs):
+    """
+           Runs the function several times and returns the best time in seconds and the last result
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        spent = time.perf_counter() - start
+        best = spent if best is None else min(best, spent)
+    return best, result
@@ -0,0 +1,56 @@
+"""
+Calendar seeding time of one flat: bulk Calendar.objects.seed against the former
+per-day CalendarForm validation and save
+
+    python -m benchmarks.seeding
+"""
+import datetime
+
+from benchmarks import setup_django, timeit
+
+setup_django()
+
+from django.contrib.auth.models import User
+from booking.forms import CalendarForm
+from booking.models import Landlord, Flat, Calendar
+
+HORIZONS = (1, 2, 5)
+
+
+def seed_by_forms(flat, start, end):
+    day = start
+    while day < end:
+        form_cal = CalendarForm({'date': day, 'id_flat': flat.id_flat, 'base_price': 0,
+                                 'min_nights_amount': 0, 'is_available': 1})
+        if form_cal.is_valid():
+            form_cal.save()
+        day += datetime.timedelta(days=1)
+
+
+def seed_bulk(flat, start, end):
+    Calendar.objects.seed(flat, start, end)
+
+
+def main():
+    user = User.objects.create_user('benchmark')
+    landlord = Landlord.objects.create(id_landlord=user)
+    start = datetime.date.today()
+    print(f"{'years':>5} {'days':>6} {'per-day forms, s':>17} {'bulk, s':>9} {'speed-up':>9}")
+    for years in HORIZONS:
+        end = start.replace(year=start.year + years)
+        timings = []
+        for seed in (seed_by_forms, seed_bulk):
+            counter = iter(range(100))
+
+            def run():
+                flat = Flat.objects.create(id_landlord=landlord, name='Flat', address='Address',
+                                           link_sites=f'{seed.__name__}{years}-{next(counter)}',
+                                           link_tenants=f'{seed.__name__}{years}-{next(counter)}')
+                seed(flat, start, end)
+            timings.append(timeit(run)[0])
+        print(f"{years:>5} {(end - start).days:>6} {timings[0]:>17.3f} {timings[1]:>9.3f} "
+              f"{timings[0] / timings[1]:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
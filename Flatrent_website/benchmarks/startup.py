@@ -0,0 +1,73 @@
+"""
+Start-up cost of a worker: import time (python -X importtime), wall time and peak RSS of a fresh interpreter
+that boots the WSGI application and loads the URLconf, as a gunicorn worker does before the first request.
+'eager' additionally imports the rendering libraries the booking views used to import on start-up
+(plotly, icalendar, dateutil and pandas/numpy via the statistics), 'lazy' is the current code
+
+    python -m benchmarks.startup [repeat]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+REPEAT = 5
+EAGER_MODULES = ['numpy', 'pandas', 'plotly', 'plotly.graph_objs', 'icalendar', 'dateutil.relativedelta']
+
+BOOT = """
+import importlib, os, resource, sys, time
+start = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = 'Flatrent_website.settings_test'
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def boot(modules):
+    """
+           Boots a worker in a new interpreter
+
+           OUTPUT
+           ---------------------
+           wall(float): boot time, ms
+           rss(float): peak RSS, MB
+           imports(dict): import time of the top-level packages (self time of all their modules), ms
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT] + modules, capture_output=True,
+                            text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    wall, rss = result.stdout.split()
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        imports[package] = imports.get(package, 0) + int(self_us) / 1000
+    return float(wall) * 1000, int(rss) / 1024, imports
+
+
+def main(repeat=REPEAT):
+    results = {}
+    for variant, modules in (('eager', EAGER_MODULES), ('lazy', [])):
+        runs = [boot(modules) for _ in range(repeat)]
+        results[variant] = runs
+        wall = statistics.median(run[0] for run in runs)
+        rss = statistics.median(run[1] for run in runs)
+        imports = statistics.median(sum(run[2].values()) for run in runs)
+        print(f'{variant:6} boot {wall:7.0f} ms   imports {imports:7.0f} ms   peak RSS {rss:6.1f} MB')
+
+    loaded = sorted({module.split('.')[0] for module in EAGER_MODULES} & set(results['lazy'][-1][2]))
+    print(f"deferred packages imported by the lazy boot: {', '.join(loaded) or 'none'}")
+    print('\nheaviest packages of the eager boot:')
+    imports = results['eager'][-1][2]
+    for name in sorted(imports, key=imports.get, reverse=True)[:8]:
+        print(f'    {name:16} {imports[name]:7.0f} ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,107 @@
+"""
+Latency and number of SQL queries of the key views on a synthetic dataset (see the generate_data command)
+at 1x, 10x and 100x scale. 1x is one landlord with 5 flats, 2 years of history and a year ahead; the scales
+add landlords with the same flats, the measured flat is always the first flat of the first landlord
+
+    python -m benchmarks.views [scale ...]
+
+Results on SQLite with the local-memory cache: 5, 50 and 500 flats with 540, 5566 and 55918 bookings
+and 5475, 54750 and 547500 calendar days, median latency of 5 requests and queries of the last request
+
+    view                       1x ms  queries    10x ms  queries   100x ms  queries
+    calendar_month GET          16.7        6      15.3        6      14.8        6
+    booking_check GET           14.1        6      12.7        6       9.9        6
+    booking_check POST          16.7        6      15.7        6      11.5        6
+    booking_list GET            31.4        8      34.3        8      22.3        8
+    statistics GET              41.4        6      46.0        6      35.8        6
+    open_link GET               11.9        5      11.9        5      10.0        5
+    site_link GET                3.1        3       2.9        3       3.2        3
+"""
+import datetime
+import io
+import logging
+import statistics
+import sys
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from booking.models import Flat, Booking, Calendar
+
+SCALES = (1, 10, 100)
+FLATS = 5
+REPEAT = 5
+
+
+def requests(flat):
+    today = datetime.date.today()
+    month = {'flat': flat.id_flat, 'cal_year': today.year, 'cal_month': today.month}
+    return [
+        ('calendar_month', 'get', '/calendar/month', {'flat': flat.id_flat}),
+        ('booking_check', 'get', '/booking/check', {'flat': flat.id_flat}),
+        ('booking_check', 'post', '/booking/check', dict(month, nextmonth='', start_date=today, end_date=today)),
+        ('booking_list', 'get', '/booking/list', {'flat': flat.id_flat}),
+        ('statistics', 'get', '/statistics', {'flat': flat.id_flat}),
+        ('open_link', 'get', f'/open_link/{flat.link_tenants}', {}),
+        ('site_link', 'get', f'/site_link/{flat.link_sites}', {}),
+    ]
+
+
+def measure(client, method, url, data):
+    """
+           Requests the page REPEAT times
+
+           OUTPUT
+           ---------------------
+           latency(float): median latency, ms
+           queries(int): number of SQL queries of the last request
+    """
+    timings = []
+    for _ in range(REPEAT):
+        # the query log is limited, the dataset generation fills it up
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{method.upper()} {url}: {response.status_code}')
+    return statistics.median(timings), len(queries)
+
+
+def main(scales):
+    # slow requests are expected here, the results are printed anyway
+    logging.getLogger('booking.metrics').setLevel(logging.ERROR)
+    landlords = 0
+    flat = None
+    results = {}
+    for scale in scales:
+        call_command('generate_data', landlords=scale - landlords, flats=FLATS, prefix=f'x{scale}-', seed=scale,
+                     stdout=io.StringIO())
+        landlords = scale
+        if flat is None:
+            flat = Flat.objects.order_by('id_flat').first()
+        cache.clear()
+        client = Client()
+        client.login(username=flat.id_landlord.id_landlord.username, password='password')
+        print(f"{scale}x: {Flat.objects.count()} flats, {Booking.objects.count()} bookings, "
+              f"{Calendar.objects.count()} calendar days")
+        for name, method, url, data in requests(flat):
+            results.setdefault((name, method), {})[scale] = measure(client, method, url, data)
+
+    print()
+    print(f"{'view':<22}" + ''.join(f"{f'{scale}x ms':>10}{'queries':>9}" for scale in scales))
+    for (name, method), by_scale in results.items():
+        print(f"{f'{name} {method.upper()}':<22}" +
+              ''.join(f"{by_scale[scale][0]:>10.1f}{by_scale[scale][1]:>9}" for scale in scales))
+
+
+if __name__ == '__main__':
+    main([int(scale) for scale in sys.argv[1:]] or SCALES)
@@ -0,0 +1,147 @@
+import calendar
+import datetime
+import time
+
+from django.core.cache import cache
+
+from .availability import FlatAvailability, search_flats
+from .models import Calendar, Flat
+
+# the cached answers are dropped by invalidate_availability on every change, the timeout only limits memory usage
+AVAILABILITY_TIMEOUT = 24 * 60 * 60
+# browsers and proxies reuse an answer for the given number of seconds and revalidate it with ETag afterwards
+AVAILABILITY_MAX_AGE = 60
+
+
+def public_flat_key(token):
+    return f'public_flat:{token}'
+
+
+def get_public_flat(token):
+    """
+           Finds the flat by the tenants link token, the flat is kept in the cache until it is changed or deleted
+
+           INPUT
+           ---------
+           token(str): link_tenants token
+
+           OUTPUT
+           ---------------------
+           flat(dict): 'id_flat', 'name'. None if there is no flat with the token
+    """
+    key = public_flat_key(token)
+    flat = cache.get(key)
+    if flat is None:
+        flat = Flat.objects.filter(link_tenants=token).values('id_flat', 'name').first()
+        if flat is None:
+            return None
+        cache.set(key, flat, AVAILABILITY_TIMEOUT)
+    return flat
+
+
+def invalidate_public_flat(token):
+    cache.delete(public_flat_key(token))
+
+
+def availability_version_key(flat):
+    return f'availability_version:{getattr(flat, "id_flat", flat)}'
+
+
+def availability_version(flat):
+    """
+           Version of the flat's calendar and bookings. A new version is issued after every invalidate_availability,
+           so all the cached answers of the flat become stale at once. The version is a part of the ETag
+    """
+    version = cache.get(availability_version_key(flat))
+    if version is None:
+        version = time.time_ns()
+        cache.set(availability_version_key(flat), version, None)
+    return version
+
+
+def invalidate_availability(flat):
+    """
+           Drops the cached availability answers of the flat. Has to be called after every change of the flat's
+           calendar or bookings
+    """
+    cache.delete(availability_version_key(flat))
+
+
+def build_month(flat, year, month):
+    """
+           Availability of the flat for the weeks of the month with two queries: calendar days and bookings
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           year(int): year
+           month(int): month
+
+           OUTPUT
+           ---------------------
+           weeks(list): weeks of the month (with the days of the adjacent months) - lists of 7 dictionaries
+           'date', 'status' (see FlatAvailability.day_status, the same as in show_calendar), 'base_price', 'min_nights'
+    """
+    dates_list = calendar.Calendar().monthdatescalendar(year, month)
+    first_day = dates_list[0][0]
+    last_day = dates_list[-1][-1]
+    days_dict = {date: (base_price, min_nights, is_available) for date, base_price, min_nights, is_available in
+                 Calendar.objects.filter(id_flat=flat, date__gte=first_day, date__lte=last_day).
+                 values_list('date', 'base_price', 'min_nights_amount', 'is_available')}
+    availability = FlatAvailability(flat, first_day, last_day + datetime.timedelta(days=1),
+                                    closed_days=False)
+    weeks = []
+    for week in dates_list:
+        days = []
+        for day in week:
+            base_price, min_nights, is_available = days_dict.get(day, (None, None, None))
+            days.append({'date': day.isoformat(), 'status': availability.day_status(day, is_available),
+                         'base_price': base_price, 'min_nights': min_nights})
+        weeks.append(days)
+    return weeks
+
+
+def month_availability(flat, year, month):
+    """
+           Returns the availability of the flat for the month (see build_month) from the cache
+
+           OUTPUT
+           ---------------------
+           weeks(list): weeks of the month
+           etag(str): quoted ETag of the answer
+    """
+    version = availability_version(flat)
+    key = f'availability:{flat}:{year}:{month}:{version}'
+    weeks = cache.get(key)
+    if weeks is None:
+        weeks = build_month(flat, year, month)
+        cache.set(key, weeks, AVAILABILITY_TIMEOUT)
+    return weeks, f'"{flat}-{year}-{month}-{version}"'
+
+
+def quote(flat, d1, d2):
+    """
+           Checks if the period [d1, d2) can be booked and calculates its price, see search_flats.
+           The answer is kept in the cache
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           d1(date): start day
+           d2(date): end day
+
+           OUTPUT
+           ---------------------
+           quote(dict): 'available', 'nights' and for the available period 'tot_price', 'discount', 'price'
+           etag(str): quoted ETag of the answer
+    """
+    version = availability_version(flat)
+    key = f'quote:{flat}:{d1}:{d2}:{version}'
+    answer = cache.get(key)
+    if answer is None:
+        found = search_flats([flat], d1, d2)
+        answer = {'available': bool(found), 'nights': (d2 - d1).days}
+        if found:
+            answer.update(tot_price=found[0]['tot_price'], discount=found[0]['discount'], price=found[0]['price'])
+        cache.set(key, answer, AVAILABILITY_TIMEOUT)
+    return answer, f'"{flat}-{d1}-{d2}-{version}"'
@@ -0,0 +1,288 @@
+import bisect
+import datetime
+
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Booking, Calendar, FlatDiscount
+
+
+def to_date(day):
+    """
+           Converts a string of format '%Y-%m-%d' or a datetime to the date, dates are returned as is
+    """
+    if isinstance(day, datetime.datetime):
+        return day.date()
+    if isinstance(day, str):
+        return datetime.datetime.strptime(day, '%Y-%m-%d').date()
+    return day
+
+
+class FlatAvailability:
+    """
+           Availability index of one flat.
+           Non-cancelled bookings are loaded once and kept sorted by the check-in date together with the running
+           maximum of the check-out dates, closed calendar days are kept as a sorted list. Any number of periods
+           can be checked afterwards by binary search without touching the database.
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           start(date): first day of the window the index is built for. None - no lower bound
+           end(date): day after the last day of the window. None - no upper bound
+           closed_days(bool): loads closed calendar days as well. Enabled by default
+    """
+
+    def __init__(self, flat, start=None, end=None, closed_days=True):
+        self.start = to_date(start)
+        self.end = to_date(end)
+        book_list = Booking.objects.filter(id_flat=flat).exclude(id_status=3)
+        days_list = Calendar.objects.filter(id_flat=flat, is_available=0)
+        if self.start is not None:
+            book_list = book_list.filter(checkout_date__gt=self.start)
+            days_list = days_list.filter(date__gte=self.start)
+        if self.end is not None:
+            book_list = book_list.filter(checkin_date__lt=self.end)
+            days_list = days_list.filter(date__lt=self.end)
+        book_list = book_list.order_by('checkin_date').values_list('id_booking', 'checkin_date', 'checkout_date')
+
+        self.starts = []
+        self.checkins = {}
+        # for every prefix of the sorted bookings: the latest check-out, its booking and the second latest check-out
+        self.best_end = []
+        self.best_id = []
+        self.second_end = []
+        best = (None, None)
+        second = None
+        for id_booking, checkin, checkout in book_list:
+            self.starts.append(checkin)
+            self.checkins[id_booking] = checkin
+            if best[0] is None or checkout > best[0]:
+                second = best[0]
+                best = (checkout, id_booking)
+            elif second is None or checkout > second:
+                second = checkout
+            self.best_end.append(best[0])
+            self.best_id.append(best[1])
+            self.second_end.append(second)
+
+        self.closed = None
+        if closed_days:
+            self.closed = sorted(days_list.values_list('date', flat=True))
+
+    def _check_window(self, d1, d2):
+        if self.start is not None and d1 < self.start:
+            raise ValueError(f'Period {d1} - {d2} is out of the index window {self.start} - {self.end}')
+        if self.end is not None and (d1 >= self.end or d2 > self.end):
+            raise ValueError(f'Period {d1} - {d2} is out of the index window {self.start} - {self.end}')
+
+    def is_booked(self, d1, d2, exc=None):
+        """
+               Checks if the period intersects a non-cancelled booking: the booking is in progress on d1
+               or starts after d1 and before d2
+
+               INPUT
+               ---------
+               d1(date): start day
+               d2(date): end day
+               exc(int): id of the booking that is excluded from the checking. None by default
+
+               OUTPUT
+               ---------------------
+               True: booked
+               False: free
+        """
+        d1, d2 = to_date(d1), to_date(d2)
+        self._check_window(d1, d2)
+        if exc is not None:
+            exc = int(exc)
+        i = bisect.bisect_right(self.starts, d1)
+        if i:
+            if self.best_id[i - 1] != exc:
+                last_checkout = self.best_end[i - 1]
+            else:
+                last_checkout = self.second_end[i - 1]
+            if last_checkout is not None and last_checkout > d1:
+                return True
+        j = bisect.bisect_left(self.starts, d2)
+        starting = j - i
+        if exc in self.checkins and d1 < self.checkins[exc] < d2:
+            starting -= 1
+        return starting > 0
+
+    def day_status(self, day, is_available):
+        """
+               Status of the calendar day shown in the calendars: a day closed by the landlord is shown as closed
+               even if it is booked
+
+               INPUT
+               ---------
+               day(date): day
+               is_available(int): is_available of the calendar day, None - the day is not in the calendar
+
+               OUTPUT
+               ---------------------
+               status(str): 'free', 'booked', 'closed' or 'none' - not in the calendar
+        """
+        if is_available is None:
+            return 'none'
+        if is_available == 0:
+            return 'closed'
+        if self.is_booked(day, day):
+            return 'booked'
+        return 'free'
+
+    def is_closed(self, d1, d2):
+        """
+               Checks if there are days closed by the landlord in the period [d1, d2)
+        """
+        if self.closed is None:
+            raise ValueError('The index is built without closed days')
+        d1, d2 = to_date(d1), to_date(d2)
+        self._check_window(d1, d2)
+        k = bisect.bisect_left(self.closed, d1)
+        return k < len(self.closed) and self.closed[k] < d2
+
+    def is_available(self, d1, d2, exc=None, edit=0):
+        """
+               Checks if the period is available for booking and editing, see period_is_available
+
+               OUTPUT
+               ---------------------
+               False: non-available
+               True: available
+        """
+        if self.is_booked(d1, d2, exc):
+            return False
+        if edit == 0 and self.is_closed(d1, d2):
+            return False
+        return True
+
+
+def search_flats(flats, d1, d2, max_price=None):
+    """
+           Finds the flats free for the period [d1, d2) with three queries whatever the number of flats:
+           calendar days of the period grouped by flats, flats with the bookings intersecting the period
+           and discounts of the flats. A flat is free if all the days of the period are in the calendar and open,
+           the period is not shorter than the min booking period of the first day and there are no bookings
+
+           INPUT
+           ---------
+           flats(list): ids of the flats
+           d1(date): start day
+           d2(date): end day
+           max_price(int): max total price with discount. None - no limit
+
+           OUTPUT
+           ---------------------
+           found(list): dictionaries 'flat' (id), 'name', 'tot_price' (base price), 'discount' (%),
+           'price' (price with discount) sorted by the price
+    """
+    d1, d2 = to_date(d1), to_date(d2)
+    nights = (d2 - d1).days
+    days = Calendar.objects.filter(id_flat__in=flats, date__gte=d1, date__lt=d2). \
+        values('id_flat', 'id_flat__name'). \
+        annotate(days=Count('id_date'), closed=Count('id_date', filter=Q(is_available=0)),
+                 tot_price=Sum('base_price'), min_nights=Max('min_nights_amount', filter=Q(date=d1))). \
+        order_by()
+    candidates = {row['id_flat']: row for row in days
+                  if row['days'] == nights and row['closed'] == 0 and row['min_nights'] is not None
+                  and nights >= row['min_nights']}
+    if not candidates:
+        return []
+
+    booked = Booking.objects.filter(id_flat__in=list(candidates), checkin_date__lt=d2, checkout_date__gt=d1). \
+        exclude(id_status=3).values_list('id_flat', flat=True).distinct()
+    for flat in booked:
+        candidates.pop(flat, None)
+
+    # the discount of the longest suitable period, as in check_discount
+    discounts = {}
+    for flat, discount in FlatDiscount.objects.filter(id_flat__in=list(candidates),
+                                                      id_discount__nights_amount__lte=nights). \
+            order_by('id_flat', 'id_discount__nights_amount').values_list('id_flat', 'id_discount__discount'):
+        discounts[flat] = discount
+
+    found = []
+    for flat, row in candidates.items():
+        discount = discounts.get(flat, 0)
+        price = int(row['tot_price'] * (100 - discount) / 100)
+        if max_price is None or price <= max_price:
+            found.append({'flat': flat, 'name': row['id_flat__name'], 'tot_price': int(row['tot_price']),
+                          'discount': discount, 'price': price})
+    return sorted(found, key=lambda item: (item['price'], item['name']))
+
+
+def find_free_windows(flats, d1, d2):
+    """
+           Finds all the maximal free windows of the flats in the period [d1, d2) with three queries: bookings,
+           calendar days and discounts of all the flats. The bookings and the days of every flat are swept in one
+           pass ordered by date. A day is free if it is in the calendar, open and not booked. A window of
+           consecutive free days is returned if it has a check-in day with the rest of the window not shorter than
+           the min booking period of the day
+
+           INPUT
+           ---------
+           flats(list): ids of the flats
+           d1(date): start day
+           d2(date): end day
+
+           OUTPUT
+           ---------------------
+           windows(dict): {id of the flat: list of the windows}, a window is a dictionary 'start', 'end'
+           (day after the last night), 'nights', 'tot_price' (base price), 'discount' (%, the tier of the longest
+           suitable period as in check_discount), 'price' (price with discount)
+    """
+    d1, d2 = to_date(d1), to_date(d2)
+    books = {}
+    for flat, checkin, checkout in Booking.objects.filter(id_flat__in=flats, checkin_date__lt=d2,
+                                                         checkout_date__gt=d1).exclude(id_status=3). \
+            order_by('id_flat', 'checkin_date').values_list('id_flat', 'checkin_date', 'checkout_date'):
+        books.setdefault(flat, []).append((checkin, checkout))
+    tiers = {}
+    for flat, nights, discount in FlatDiscount.objects.filter(id_flat__in=flats). \
+            order_by('id_flat', 'id_discount__nights_amount'). \
+            values_list('id_flat', 'id_discount__nights_amount', 'id_discount__discount'):
+        tiers.setdefault(flat, ([], []))
+        tiers[flat][0].append(nights)
+        tiers[flat][1].append(discount)
+
+    windows = {flat: [] for flat in flats}
+    run = []
+    flat = None
+
+    def close_run():
+        # the window is bookable if the stay from one of its days to the end is long enough for the day
+        end = run[-1][0] + datetime.timedelta(days=1)
+        if any((end - day).days >= min_nights for day, base_price, min_nights in run):
+            nights = len(run)
+            tot_price = sum(base_price for day, base_price, min_nights in run)
+            nights_list, discounts = tiers.get(flat, ([], []))
+            k = bisect.bisect_right(nights_list, nights)
+            discount = discounts[k - 1] if k else 0
+            windows[flat].append({'start': run[0][0], 'end': end, 'nights': nights, 'tot_price': tot_price,
+                                  'discount': discount, 'price': int(tot_price * (100 - discount) / 100)})
+        run.clear()
+
+    days_list = Calendar.objects.filter(id_flat__in=flats, date__gte=d1, date__lt=d2).order_by('id_flat', 'date'). \
+        values_list('id_flat', 'date', 'base_price', 'min_nights_amount', 'is_available')
+    for id_flat, date, base_price, min_nights, is_available in days_list.iterator():
+        if id_flat != flat:
+            if run:
+                close_run()
+            flat = id_flat
+            flat_books = books.get(flat, [])
+            i = 0
+            last_checkout = None
+        # bookings started before or on the day, the day is booked if one of them is not checked out yet
+        while i < len(flat_books) and flat_books[i][0] <= date:
+            if last_checkout is None or flat_books[i][1] > last_checkout:
+                last_checkout = flat_books[i][1]
+            i += 1
+        free = is_available == 1 and (last_checkout is None or last_checkout <= date)
+        if run and (not free or (date - run[-1][0]).days > 1):
+            close_run()
+        if free:
+            run.append((date, base_price, min_nights))
+    if run:
+        close_run()
+    return windows
@@ -0,0 +1,102 @@
+import csv
+import itertools
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Booking, BookingTenant, Calendar, Occupancy
+from .prices import with_base_price, booking_discount
+
+# number of rows fetched from the database at once, the export never holds more rows in memory
+EXPORT_CHUNK_SIZE = 2000
+
+BOOKING_HEADER = ['Бронирование', 'Объект', 'Заезд', 'Выезд', 'Ночей', 'Цена', 'Скидка, %', 'Статус', 'Источник',
+                  'Имя', 'Телефон', 'Дата бронирования', 'Комментарий']
+CALENDAR_HEADER = ['Объект', 'Дата', 'Базовая цена', 'Мин. срок', 'Открыт', 'Занят', 'Бронирование', 'Цена дня']
+
+
+class Echo:
+    """
+           File-like object returning the written line instead of storing it, for csv.writer in streaming responses
+    """
+
+    def write(self, value):
+        return value
+
+
+def chunks(rows, size=EXPORT_CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def booking_rows(flats):
+    """
+           Rows of the bookings export of the flats: bookings with their tenants, sources, statuses and discounts.
+           Bookings are read from the database by chunks, the tenants of a chunk are loaded with one query
+
+           INPUT
+           ---------
+           flats(list): ids of the flats
+
+           OUTPUT
+           ---------------------
+           rows(generator): header and the rows of the bookings
+    """
+    yield BOOKING_HEADER
+    # the order of the flat index, so the database starts returning rows without sorting all of them
+    book_list = with_base_price(Booking.objects.filter(id_flat__in=flats)).order_by('id_flat', 'checkin_date'). \
+        values_list('id_booking', 'id_flat__name', 'checkin_date', 'checkout_date', 'price', 'base_total',
+                    'id_status__name', 'id_source__name', 'booking_date', 'comment')
+    for chunk in chunks(book_list.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        tenants = {}
+        for id_booking, name, phone in BookingTenant.objects.filter(id_booking__in=[row[0] for row in chunk]). \
+                order_by('id_booking_tenant').values_list('id_booking', 'phone__name', 'phone'):
+            tenants.setdefault(id_booking, []).append((name, phone))
+        for id_booking, flat, checkin, checkout, price, base_total, status, source, booking_date, comment in chunk:
+            booking_tenants = tenants.get(id_booking, [])
+            yield [id_booking, flat, checkin, checkout, (checkout - checkin).days, price,
+                   booking_discount(base_total, price), status, source,
+                   ', '.join(name for name, phone in booking_tenants),
+                   ', '.join(phone for name, phone in booking_tenants), timezone.localtime(booking_date).date(),
+                   comment or '']
+
+
+def calendar_rows(flats):
+    """
+           Rows of the calendar export of the flats: calendar days with the occupancy of the day
+
+           INPUT
+           ---------
+           flats(list): ids of the flats
+
+           OUTPUT
+           ---------------------
+           rows(generator): header and the rows of the days
+    """
+    yield CALENDAR_HEADER
+    occupancy = Occupancy.objects.filter(id_flat=OuterRef('id_flat'), date=OuterRef('date'))
+    days = Calendar.objects.filter(id_flat__in=flats). \
+        annotate(is_booked=Subquery(occupancy.values('is_booked')[:1]),
+                 id_booking=Subquery(occupancy.values('id_booking')[:1]),
+                 price=Subquery(occupancy.values('price')[:1])). \
+        order_by('id_flat', 'date'). \
+        values_list('id_flat__name', 'date', 'base_price', 'min_nights_amount', 'is_available', 'is_booked',
+                    'id_booking', 'price')
+    for name, date, base_price, min_nights, is_available, is_booked, id_booking, price in \
+            days.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [name, date, base_price, min_nights, is_available, is_booked or 0, id_booking or '',
+               round(price, 2) if price is not None else '']
+
+
+def csv_lines(rows):
+    """
+           Converts the rows to the CSV lines one by one. The first line starts with BOM, so Excel recognizes UTF-8
+    """
+    writer = csv.writer(Echo(), delimiter=';')
+    yield '\ufeff'
+    for row in rows:
+        yield writer.writerow(row)
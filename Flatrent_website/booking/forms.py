@@ -29,7 +29,25 @@ class CheckDataForm(forms.Form):
     discount = forms.CharField(required=False)
     nights_amount = forms.CharField(required=False)
 
+class CalendarParamsForm(forms.Form):
+    price = forms.IntegerField(required=False, min_value=0)
+    nights_amount = forms.IntegerField(required=False, min_value=1)
+
 class CalendarForm(ModelForm):
     class Meta:
         model = Calendar
         fields = "__all__"
+
+class BookingFilterForm(forms.Form):
+    sort = forms.TypedChoiceField(choices=[(0, 'booking_date'), (1, 'checkin_date'), (2, 'id_status')],
+                                  coerce=int, required=False, empty_value=0)
+    status = forms.IntegerField(required=False)
+    source = forms.IntegerField(required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    after = forms.CharField(required=False)
+
+class FlatSearchForm(forms.Form):
+    start_date = forms.DateField()
+    end_date = forms.DateField()
+    max_price = forms.IntegerField(required=False, min_value=0)
@@ -0,0 +1,82 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Booking
+
+# the feed is dropped by invalidate_ical on every booking change, the timeout only limits memory usage
+ICAL_TIMEOUT = 24 * 60 * 60
+
+
+def ical_key(flat):
+    return f'ical:{getattr(flat, "id_flat", flat)}'
+
+
+def build_ical(flat, since):
+    """
+           Generates the .ics calendar of the flat with the expected and in-progress bookings
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           since(date): bookings checked out before the day are not included
+
+           OUTPUT
+           ---------------------
+           content(bytes): .ics file content
+    """
+    # the feed is built only when the cached one is stale, icalendar is not imported by the workers on start-up
+    import icalendar
+
+    book_list = Booking.objects.filter(id_flat=flat, id_status__in=['2', '4'], checkout_date__gte=since). \
+        order_by('checkin_date').values_list('checkin_date', 'checkout_date')
+    cal = icalendar.Calendar()
+    cal.add('prodid', 'FlatRen')
+    cal.add('version', '2.0')
+
+    for checkin_date, checkout_date in book_list:
+        event = icalendar.Event()
+        event.add('summary', 'Booked on FlatRent')
+        event.add('dtstart', checkin_date)
+        event.add('dtend', checkout_date)
+        cal.add_component(event)
+    return cal.to_ical()
+
+
+def get_ical(flat):
+    """
+           Returns the .ics calendar of the flat from the cache, the calendar is generated if it is not cached
+           or was generated on another day. Bookings finished more than settings.ICAL_PAST_DAYS days ago are trimmed
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+
+           OUTPUT
+           ---------------------
+           feed(dict): 'content' - .ics file content, 'etag' - quoted hash of the content,
+           'last_modified' - timestamp of the last content change
+    """
+    today = datetime.date.today()
+    key = ical_key(flat)
+    feed = cache.get(key)
+    if feed is None or feed['date'] != today:
+        content = build_ical(flat, today - datetime.timedelta(days=settings.ICAL_PAST_DAYS))
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if feed is not None and feed['etag'] == etag:
+            last_modified = feed['last_modified']
+        else:
+            last_modified = int(time.time())
+        feed = {'date': today, 'content': content, 'etag': etag, 'last_modified': last_modified}
+        cache.set(key, feed, ICAL_TIMEOUT)
+    return feed
+
+
+def invalidate_ical(flat):
+    """
+           Drops the cached .ics calendar of the flat. Has to be called after every change of the flat's bookings
+    """
+    cache.delete(ical_key(flat))
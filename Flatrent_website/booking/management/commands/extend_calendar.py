@@ -0,0 +1,106 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+
+from booking.api import invalidate_availability
+from booking.models import Booking, Calendar, Flat, Occupancy
+from booking.occupancy import refresh_occupancy
+from booking.prices import invalidate_price_index
+
+# number of the expired calendar days deleted in one query
+DELETE_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = "Extends the calendars of all the flats to the given number of days ahead. New days copy the base price " \
+           "and the min booking period of the last day in the calendar. Safe to run repeatedly, e.g. nightly"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help="horizon in days from today, 365 by default")
+        parser.add_argument('--retention-days', type=int,
+                            help="deletes the calendar days older than the given number of days, "
+                                 "except the days of the bookings")
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help="number of flats processed in one transaction, 200 by default")
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        today = datetime.date.today()
+        horizon = today + datetime.timedelta(days=options['days'])
+
+        # the last calendar day of every flat: the dates are grouped by flat, then the days with these dates
+        # are selected, two queries for all the flats
+        last_dates = dict(Calendar.objects.values('id_flat').annotate(last_date=Max('date')).order_by().
+                          values_list('id_flat', 'last_date'))
+        last_days = {id_flat: (date, base_price, min_nights_amount) for id_flat, date, base_price, min_nights_amount
+                     in Calendar.objects.filter(date__in=set(last_dates.values())).
+                     values_list('id_flat', 'date', 'base_price', 'min_nights_amount')
+                     if last_dates.get(id_flat) == date}
+        flat_ids = list(Flat.objects.order_by('id_flat').values_list('id_flat', flat=True))
+
+        days_number = 0
+        flats_number = 0
+        for i in range(0, len(flat_ids), options['chunk_size']):
+            days = []
+            extended = {}
+            for id_flat in flat_ids[i:i + options['chunk_size']]:
+                last_date, base_price, min_nights_amount = last_days.get(id_flat, (None, 0, 0))
+                first_date = today if last_date is None else max(last_date + datetime.timedelta(days=1), today)
+                if first_date >= horizon:
+                    continue
+                extended[id_flat] = first_date
+                days.extend(Calendar(date=first_date + datetime.timedelta(days=k), id_flat_id=id_flat,
+                                     base_price=base_price, min_nights_amount=min_nights_amount, is_available=1)
+                            for k in range((horizon - first_date).days))
+            # new days are free unless a booking already reaches them
+            booked = {id_flat for id_flat, checkout_date in
+                      Booking.objects.filter(id_flat__in=list(extended), checkout_date__gt=today).
+                      exclude(id_status=3).values_list('id_flat', 'checkout_date')
+                      if checkout_date > extended[id_flat]}
+            occupancy = [Occupancy(id_flat_id=day.id_flat_id, date=day.date, is_booked=0, price=day.base_price)
+                         for day in days if day.id_flat_id not in booked]
+            with transaction.atomic():
+                Calendar.objects.bulk_create(days, batch_size=1000, ignore_conflicts=True)
+                Occupancy.objects.bulk_create(occupancy, batch_size=1000, ignore_conflicts=True)
+                for id_flat in booked:
+                    refresh_occupancy(id_flat, extended[id_flat], horizon)
+            for id_flat in extended:
+                invalidate_price_index(id_flat)
+                invalidate_availability(id_flat)
+            days_number += len(days)
+            flats_number += len(extended)
+
+        self.stdout.write(f"{days_number} day(s) added to {flats_number} of {len(flat_ids)} flat(s), "
+                          f"horizon {horizon}")
+
+        if options['retention_days'] is not None:
+            border = today - datetime.timedelta(days=options['retention_days'])
+            # the days of the bookings are kept: the base totals and the discounts of the bookings are
+            # calculated from them
+            booked = Booking.objects.filter(id_flat=OuterRef('id_flat'), checkin_date__lte=OuterRef('date'),
+                                            checkout_date__gt=OuterRef('date'))
+            expired = Calendar.objects.filter(date__lt=border).exclude(Exists(booked)).order_by('pk')
+            deleted = 0
+            flats = set()
+            last_pk = None
+            while True:
+                batch = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+                batch = list(batch.values_list('pk', 'id_flat')[:DELETE_BATCH_SIZE])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                flats.update(id_flat for pk, id_flat in batch)
+                # nothing refers to the calendar days, so they are deleted without loading the rows and sending
+                # post_delete for every day, the caches are dropped once per flat below
+                with transaction.atomic():
+                    deleted += Calendar.objects.filter(pk__in=[pk for pk, id_flat in batch])._raw_delete(
+                        Calendar.objects.db)
+            for id_flat in flats:
+                invalidate_price_index(id_flat)
+                invalidate_availability(id_flat)
+            self.stdout.write(f"{deleted} day(s) before {border} deleted in {len(flats)} flat(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - start_time:.1f} s"))
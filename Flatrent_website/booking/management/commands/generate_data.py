@@ -0,0 +1,184 @@
+import datetime
+import random
+import secrets
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from booking.models import Booking, BookingTenant, Calendar, Discount, Flat, FlatDiscount, FlatSource, Landlord, \
+    Occupancy, Source, Status, Tenant, STATUSES
+from booking.occupancy import rebuild_occupancy
+
+SOURCES = ['Avito', 'Airbnb', 'Booking', 'Cian', 'Суточно', 'Прямое']
+DISCOUNTS = [(7, 5), (14, 10), (30, 20)]
+NAMES = ['Иван', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Анна', 'Сергей', 'Елена', 'Павел', 'Наталья']
+# length of stay in nights and its weight: mostly short stays, sometimes a month
+STAYS = list(range(1, 31))
+STAY_WEIGHTS = [12, 14, 14, 11, 9, 7, 8, 4, 3, 3, 2, 2, 2, 3] + [1] * 15 + [2]
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic dataset: landlords, flats with calendars, bookings (with cancellations " \
+           "overlapping other bookings), tenants, sources and discounts. Landlords are users " \
+           "'<prefix>1', '<prefix>2', ... with the given password"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--landlords', type=int, default=1, help="number of landlords, 1 by default")
+        parser.add_argument('--flats', type=int, default=3, help="number of flats of every landlord, 3 by default")
+        parser.add_argument('--years', type=int, default=2,
+                            help="years of history in the calendars before today, 2 by default")
+        parser.add_argument('--days-ahead', type=int, default=365,
+                            help="calendar days after today, 365 by default")
+        parser.add_argument('--cancel-rate', type=float, default=0.1,
+                            help="share of the cancelled bookings, 0.1 by default")
+        parser.add_argument('--prefix', default='landlord', help="username prefix of the landlords")
+        parser.add_argument('--password', default='password', help="password of the landlords")
+        parser.add_argument('--seed', type=int, help="random seed to get the same dataset again")
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        rnd = random.Random(options['seed'])
+        today = datetime.date.today()
+        start = today - relativedelta(years=options['years'])
+        end = today + datetime.timedelta(days=options['days_ahead'])
+
+        usernames = [f"{options['prefix']}{i}" for i in range(1, options['landlords'] + 1)]
+        if User.objects.filter(username__in=usernames).exists():
+            raise CommandError(f"Users with the prefix '{options['prefix']}' already exist, choose another prefix")
+
+        for id_status, name in STATUSES.items():
+            Status.objects.get_or_create(id_status=id_status, defaults={'name': name})
+        sources = [Source.objects.get_or_create(name=name)[0] for name in SOURCES]
+        discounts = [Discount.objects.get_or_create(nights_amount=nights, discount=value)[0]
+                     for nights, value in DISCOUNTS]
+
+        self.next_phone = rnd.randrange(10 ** 9)
+        self.tenants = []
+        flat_ids = []
+        bookings_number = 0
+        for username in usernames:
+            with transaction.atomic():
+                user = User.objects.create_user(username, password=options['password'])
+                landlord = Landlord.objects.create(id_landlord=user)
+                for k in range(1, options['flats'] + 1):
+                    flat = Flat.objects.create(id_landlord=landlord, name=f'Квартира {k}',
+                                               address=f'ул. Тестовая, д. {rnd.randint(1, 200)}, кв. {k}',
+                                               link_sites=secrets.token_urlsafe(16),
+                                               link_tenants=secrets.token_urlsafe(16))
+                    flat_sources = rnd.sample(sources, rnd.randint(2, 4))
+                    FlatSource.objects.bulk_create([FlatSource(id_flat=flat, id_source=source)
+                                                    for source in flat_sources])
+                    flat_discounts = discounts[:rnd.randint(0, len(discounts))]
+                    FlatDiscount.objects.bulk_create([FlatDiscount(id_flat=flat, id_discount=discount)
+                                                      for discount in flat_discounts])
+                    bookings_number += self.generate_flat(rnd, flat, flat_sources, flat_discounts, start, end,
+                                                          today, options['cancel_rate'])
+                    flat_ids.append(flat.id_flat)
+
+        for id_flat in flat_ids:
+            rebuild_occupancy(id_flat)
+
+        self.stdout.write(f"{len(usernames)} landlord(s), {len(flat_ids)} flat(s), "
+                          f"{Calendar.objects.filter(id_flat__in=flat_ids).count()} calendar day(s), "
+                          f"{bookings_number} booking(s), "
+                          f"{Occupancy.objects.filter(id_flat__in=flat_ids).count()} occupancy day(s)")
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - start_time:.1f} s"))
+
+    def tenant(self, rnd):
+        # every third booking is made by a returning tenant
+        if self.tenants and rnd.random() < 0.3:
+            return rnd.choice(self.tenants)
+        self.next_phone += 1
+        tenant = Tenant(phone=f'79{self.next_phone % 10 ** 9:09d}', name=rnd.choice(NAMES))
+        self.tenants.append(tenant)
+        return tenant
+
+    def generate_flat(self, rnd, flat, sources, discounts, start, end, today, cancel_rate):
+        """
+               Generates the calendar and the bookings of the flat for the period [start, end)
+
+               OUTPUT
+               ---------------------
+               bookings_number(int): number of generated bookings
+        """
+        base_price = rnd.randrange(1500, 6000, 100)
+        min_nights = rnd.choice([1, 1, 2, 3])
+        days = {}
+        day = start
+        while day < end:
+            price = base_price
+            if day.weekday() >= 4:
+                price = price * 6 // 5
+            if day.month in (6, 7, 8):
+                price = price * 13 // 10
+            days[day] = Calendar(date=day, id_flat=flat, base_price=price, min_nights_amount=min_nights,
+                                 is_available=1)
+            day += datetime.timedelta(days=1)
+
+        bookings = []
+        booking_dates = []
+        phones = []
+        new_tenants = []
+        day = start
+        while day < end:
+            nights = max(min_nights, rnd.choices(STAYS, STAY_WEIGHTS)[0])
+            checkout = min(day + datetime.timedelta(days=nights), end)
+            total = sum(days[day + datetime.timedelta(days=k)].base_price for k in range((checkout - day).days))
+            discount = max([value.discount for value in discounts if value.nights_amount <= nights], default=0)
+            # some tenants get an extra discount from the landlord
+            discount += rnd.choice([0, 0, 0, 5, 10])
+            cancelled = rnd.random() < cancel_rate
+            if cancelled:
+                id_status = 3
+            elif checkout <= today:
+                id_status = 1
+            elif day <= today:
+                id_status = 4
+            else:
+                id_status = 2
+            lead = rnd.randint(0, 90)
+            booking_date = timezone.make_aware(datetime.datetime.combine(min(day - datetime.timedelta(days=lead),
+                                                                             today), datetime.time(12)))
+            bookings.append(Booking(id_flat=flat, id_source=rnd.choice(sources), id_status_id=id_status,
+                                    checkin_date=day, checkout_date=checkout,
+                                    price=int(total * (100 - min(discount, 100)) / 100),
+                                    comment=rnd.choice([None, None, None, 'Ранний заезд', 'С животным'])))
+            booking_dates.append(booking_date)
+            tenant = self.tenant(rnd)
+            if tenant._state.adding:
+                new_tenants.append(tenant)
+                tenant._state.adding = False
+            phones.append(tenant.phone)
+            if cancelled:
+                # the cancelled period is usually booked again by somebody else
+                day += datetime.timedelta(days=rnd.randint(0, nights - 1))
+                continue
+            day = checkout
+            gap = rnd.choices([0, 1, 2, 3, 5, 7, 14], [30, 20, 15, 12, 10, 8, 5])[0]
+            close = rnd.random() < 0.05
+            for k in range(gap):
+                if day >= end:
+                    break
+                if close:
+                    days[day].is_available = 0
+                day += datetime.timedelta(days=1)
+
+        Calendar.objects.bulk_create(days.values(), batch_size=1000)
+        Tenant.objects.bulk_create(new_tenants, batch_size=1000, ignore_conflicts=True)
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        # MySQL doesn't return the ids of the bulk created bookings. The flat is new and its bookings are inserted
+        # in order, so the ids assigned by the database follow the order of the list
+        for booking, id_booking in zip(bookings, Booking.objects.filter(id_flat=flat).order_by('id_booking').
+                                       values_list('id_booking', flat=True)):
+            booking.id_booking = id_booking
+        BookingTenant.objects.bulk_create([BookingTenant(id_booking=booking, phone_id=phone)
+                                           for booking, phone in zip(bookings, phones)], batch_size=1000)
+        # booking_date is auto_now_add and is overwritten on insert
+        for booking, booking_date in zip(bookings, booking_dates):
+            booking.booking_date = booking_date
+        Booking.objects.bulk_update(bookings, ['booking_date'], batch_size=500)
+        return len(bookings)
@@ -0,0 +1,159 @@
+import datetime
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from booking.api import invalidate_availability
+from booking.ical import invalidate_ical
+from booking.models import Booking, BookingTenant, Calendar, Flat, Source, Status, Tenant, STATUSES
+from booking.occupancy import refresh_occupancy
+from booking.prices import invalidate_price_index
+
+# columns of the historical CSV (see DB_CSV/main.py)
+COLUMNS = ['Имя', 'Телефон', 'Сайт', 'Заезд', 'Выезд', 'Сумма', 'Базовая цена', 'Статус', 'Дата']
+
+
+class Command(BaseCommand):
+    help = "Imports the bookings of the flat from the historical CSV (columns: " + ", ".join(COLUMNS) + "). " \
+           "The file is read in chunks, every chunk is saved in one transaction: sources and tenants are " \
+           "upserted, bookings, booking tenants and missing calendar days are bulk created. " \
+           "Bookings that are already in the database (same dates and price) are skipped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="path to the CSV file")
+        parser.add_argument('--flat', type=int, required=True, help="id of the flat")
+        parser.add_argument('--encoding', default='utf-16', help="encoding of the file, utf-16 by default")
+        parser.add_argument('--date-format', default='%d.%m.%Y', help="format of the dates, %%d.%%m.%%Y by default")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="number of rows saved in one transaction, 5000 by default")
+        parser.add_argument('--min-nights', type=int, default=1,
+                            help="min booking period of the calendar days created by the import, 1 by default")
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        try:
+            self.flat = Flat.objects.get(id_flat=options['flat'])
+        except Flat.DoesNotExist:
+            raise CommandError(f"Flat {options['flat']} does not exist")
+        self.date_format = options['date_format']
+        self.min_nights = options['min_nights']
+        for id_status, name in STATUSES.items():
+            Status.objects.get_or_create(id_status=id_status, defaults={'name': name})
+        self.sources = dict(Source.objects.values_list('name', 'id_source'))
+
+        rows = imported = 0
+        self.first_day = self.last_day = None
+        reader = pd.read_csv(options['path'], encoding=options['encoding'], usecols=COLUMNS, dtype=str,
+                             chunksize=options['chunk_size'])
+        for chunk in reader:
+            chunk = chunk.dropna(subset=['Заезд', 'Выезд', 'Сайт', 'Статус'])
+            if chunk.empty:
+                continue
+            with transaction.atomic():
+                imported += self.import_chunk(chunk)
+            rows += len(chunk)
+            spent = time.perf_counter() - start_time
+            self.stdout.write(f"{rows} row(s) read, {imported} booking(s) imported, {rows / spent:.0f} rows/s")
+
+        if self.first_day is not None:
+            # bulk inserts don't send signals: caches and the occupancy are updated once for the imported period
+            invalidate_price_index(self.flat.id_flat)
+            invalidate_ical(self.flat.id_flat)
+            invalidate_availability(self.flat.id_flat)
+            refresh_occupancy(self.flat.id_flat, self.first_day, self.last_day)
+        self.stdout.write(self.style.SUCCESS(f"{imported} of {rows} booking(s) imported in "
+                                             f"{time.perf_counter() - start_time:.1f} s"))
+
+    def source_ids(self, names):
+        """
+               Ids of the sources by names, creates the missing sources
+        """
+        missing = set(names) - set(self.sources)
+        if missing:
+            Source.objects.bulk_create([Source(name=name) for name in sorted(missing)])
+            # MySQL doesn't return the ids of the bulk created rows
+            self.sources.update(Source.objects.filter(name__in=missing).values_list('name', 'id_source'))
+        return [self.sources[name] for name in names]
+
+    def import_chunk(self, chunk):
+        """
+               Saves one chunk of the CSV
+
+               OUTPUT
+               ---------------------
+               imported(int): number of the new bookings
+        """
+        checkin = pd.to_datetime(chunk['Заезд'], format=self.date_format).dt.date.tolist()
+        checkout = pd.to_datetime(chunk['Выезд'], format=self.date_format).dt.date.tolist()
+        booking_date = pd.to_datetime(chunk['Дата'], format=self.date_format).tolist()
+        price = pd.to_numeric(chunk['Сумма'], errors='coerce').fillna(0).astype(int).tolist()
+        base_price = pd.to_numeric(chunk['Базовая цена'], errors='coerce').fillna(0).astype(int).tolist()
+        status = pd.to_numeric(chunk['Статус']).astype(int).tolist()
+        sources = self.source_ids(chunk['Сайт'].str.strip().str.title().tolist())
+        phones = chunk['Телефон'].fillna('').str.replace(r'\D', '', regex=True).tolist()
+        names = chunk['Имя'].fillna('').str.strip().str.title().tolist()
+
+        existing = set(Booking.objects.filter(id_flat=self.flat, checkin_date__gte=min(checkin),
+                                              checkin_date__lte=max(checkin)).
+                       values_list('checkin_date', 'checkout_date', 'price'))
+        bookings = []
+        booking_dates = []
+        booking_phones = []
+        tenants = {}
+        days = {}
+        for i in range(len(checkin)):
+            key = (checkin[i], checkout[i], price[i])
+            if key in existing or checkout[i] <= checkin[i]:
+                continue
+            existing.add(key)
+            bookings.append(Booking(id_flat=self.flat, id_source_id=sources[i], id_status_id=status[i],
+                                    checkin_date=checkin[i], checkout_date=checkout[i], price=price[i]))
+            booking_dates.append(booking_date[i])
+            booking_phones.append(phones[i])
+            if phones[i]:
+                tenants[phones[i]] = Tenant(phone=phones[i], name=names[i])
+            day = checkin[i]
+            while day < checkout[i]:
+                days.setdefault(day, base_price[i])
+                day += datetime.timedelta(days=1)
+        if not bookings:
+            return 0
+        first_day = min(booking.checkin_date for booking in bookings)
+        last_day = max(booking.checkout_date for booking in bookings)
+        self.first_day = first_day if self.first_day is None else min(self.first_day, first_day)
+        self.last_day = last_day if self.last_day is None else max(self.last_day, last_day)
+
+        # upsert without update_conflicts: MySQL doesn't support the conflict target (unique_fields)
+        phones = list(tenants)
+        existing_phones = set()
+        for i in range(0, len(phones), 500):
+            existing_phones.update(Tenant.objects.filter(phone__in=phones[i:i + 500]).values_list('phone', flat=True))
+        Tenant.objects.bulk_create([tenant for phone, tenant in tenants.items() if phone not in existing_phones],
+                                   batch_size=1000)
+        Tenant.objects.bulk_update([tenant for phone, tenant in tenants.items() if phone in existing_phones],
+                                   ['name'], batch_size=500)
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        # MySQL doesn't return the ids of the bulk created bookings, the ids are found by the period and the price,
+        # which are unique among the bookings of the flat (the duplicates are skipped above)
+        book_list = Booking.objects.filter(id_flat=self.flat, checkin_date__gte=min(checkin),
+                                           checkin_date__lte=max(checkin)).order_by('id_booking'). \
+            values_list('id_booking', 'checkin_date', 'checkout_date', 'price')
+        ids = {(checkin_date, checkout_date, booking_price): id_booking
+               for id_booking, checkin_date, checkout_date, booking_price in book_list}
+        for booking in bookings:
+            booking.id_booking = ids[(booking.checkin_date, booking.checkout_date, booking.price)]
+        BookingTenant.objects.bulk_create([BookingTenant(id_booking=booking, phone_id=phone)
+                                           for booking, phone in zip(bookings, booking_phones) if phone],
+                                          batch_size=1000)
+        # booking_date is auto_now_add and is overwritten on insert
+        for booking, date in zip(bookings, booking_dates):
+            if pd.notnull(date):
+                booking.booking_date = timezone.make_aware(date.to_pydatetime())
+        Booking.objects.bulk_update(bookings, ['booking_date'], batch_size=500)
+        Calendar.objects.bulk_create([Calendar(date=day, id_flat=self.flat, base_price=price,
+                                               min_nights_amount=self.min_nights, is_available=1)
+                                      for day, price in days.items()], batch_size=1000, ignore_conflicts=True)
+        return len(bookings)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily occupancy table from the calendar and the bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flat', type=int, help="id of the flat, all the flats by default")
+
+    def handle(self, *args, **options):
+        flats_number = rebuild_occupancy(options['flat'])
+        self.stdout.write(self.style.SUCCESS(f"Occupancy is rebuilt for {flats_number} flat(s)"))
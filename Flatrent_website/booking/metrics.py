@@ -0,0 +1,165 @@
+import collections
+import contextvars
+import math
+import os
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# upper bounds of the latency histogram buckets, ms
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# statistics of the request being processed in the current thread
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class RequestStats:
+    """
+           SQL queries and template rendering of one request.
+           The object is installed as a database execute wrapper, so it sees every query of the request
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = collections.Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated(self, top=5):
+        """
+               The most repeated SQL statements (with placeholders instead of the parameters) - N+1 candidates
+
+               OUTPUT
+               ---------------------
+               statements(list): [(sql, number of executions), ...] of the statements executed more than once
+        """
+        return [(sql, n) for sql, n in self.statements.most_common(top) if n > 1]
+
+
+def percentile(values, p):
+    """
+           Percentile p (0-100) of the sorted values by the nearest rank
+    """
+    if not values:
+        return 0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class ViewMetrics:
+    """
+           Aggregated metrics of one view: total counters, the latency histogram and the last samples
+           used for the percentiles
+
+           INPUT
+           ---------
+           samples(int): number of the last requests kept for the percentiles
+    """
+
+    def __init__(self, samples):
+        self.count = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency = collections.deque(maxlen=samples)
+        self.queries = collections.deque(maxlen=samples)
+        self.db_time = collections.deque(maxlen=samples)
+        self.template_time = collections.deque(maxlen=samples)
+
+    def add(self, latency, stats):
+        self.count += 1
+        ms = latency * 1000
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and ms > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        self.latency.append(ms)
+        self.queries.append(stats.queries)
+        self.db_time.append(stats.db_time * 1000)
+        self.template_time.append(stats.template_time * 1000)
+
+    def summary(self):
+        result = {'count': self.count,
+                  'histogram': dict(zip([f'le_{b}ms' for b in LATENCY_BUCKETS] + ['inf'], self.histogram))}
+        for name in ('latency', 'queries', 'db_time', 'template_time'):
+            values = sorted(getattr(self, name))
+            result[name] = {'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                            'p99': percentile(values, 99), 'max': values[-1] if values else 0}
+        return result
+
+
+class MetricsRegistry:
+    """
+           Metrics of the views of the process. Every worker process keeps its own registry
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, name, latency, stats, samples=1000):
+        with self.lock:
+            if name not in self.views:
+                self.views[name] = ViewMetrics(samples)
+            self.views[name].add(latency, stats)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metrics.summary() for name, metrics in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+registry = MetricsRegistry()
+
+
+def metrics_text(snapshot):
+    """
+           Plain text table of the metrics snapshot, ms
+    """
+    lines = [f'# requests served by the worker process {os.getpid()} only, every worker keeps its own metrics',
+             f'{"view":<20} {"count":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"queries p95":>12} '
+             f'{"db p95":>8} {"tpl p95":>8}']
+    for name, m in snapshot.items():
+        lines.append(f'{name:<20} {m["count"]:>7} {m["latency"]["p50"]:>8.1f} {m["latency"]["p95"]:>8.1f} '
+                     f'{m["latency"]["p99"]:>8.1f} {m["queries"]["p95"]:>12} {m["db_time"]["p95"]:>8.1f} '
+                     f'{m["template_time"]["p95"]:>8.1f}')
+        lines.append('    ' + ' '.join(f'{bucket}:{n}' for bucket, n in m['histogram'].items() if n))
+    return '\n'.join(lines) + '\n'
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = current_request.get()
+        if stats is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+           Django template backend that adds the rendering time to the statistics of the current request
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,164 @@
+import contextlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .metrics import RequestStats, current_request, registry
+from .models import Flat
+
+logger = logging.getLogger('booking.metrics')
+
+# session key of the cached ids of the landlord's flats
+OWNED_FLATS_SESSION_KEY = 'owned_flats'
+
+
+def owned_flats_key(landlord):
+    return f'owned_flats:{landlord}'
+
+
+def owned_flats_version(landlord):
+    """
+           Version of the landlord's flat list. A new version is issued after every invalidate_owned_flats,
+           so the ids cached in all the sessions of the landlord become stale at once
+    """
+    version = cache.get(owned_flats_key(landlord))
+    if version is None:
+        version = time.time_ns()
+        cache.set(owned_flats_key(landlord), version, None)
+    return version
+
+
+def invalidate_owned_flats(landlord):
+    cache.delete(owned_flats_key(landlord))
+
+
+class FlatContext:
+    """
+           Landlord's flats resolved once per request (request.flats):
+            - owned_ids: ids of the landlord's flats, cached in the session until a flat is added or deleted
+            - flat_list: landlord's flats ordered by name (lazy QuerySet for the navbar)
+            - selected: flat chosen by the 'flat' parameter of the request, None if it is missing or unknown
+
+           INPUT
+           ---------
+           request:  http request of an authenticated user
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.landlord = request.user.id
+
+    @cached_property
+    def owned_ids(self):
+        session = self.request.session
+        version = owned_flats_version(self.landlord)
+        cached = session.get(OWNED_FLATS_SESSION_KEY)
+        if cached and cached['landlord'] == self.landlord and cached['version'] == version:
+            return frozenset(cached['ids'])
+        ids = list(Flat.objects.filter(id_landlord=self.landlord).values_list('id_flat', flat=True))
+        session[OWNED_FLATS_SESSION_KEY] = {'landlord': self.landlord, 'version': version, 'ids': ids}
+        return frozenset(ids)
+
+    @cached_property
+    def flat_list(self):
+        return Flat.objects.order_by('name').filter(id_landlord=self.landlord)
+
+    @cached_property
+    def selected(self):
+        params = self.request.POST if self.request.method == "POST" else self.request.GET
+        try:
+            return Flat.objects.get(id_flat=params['flat'])
+        except (KeyError, ValueError, Flat.DoesNotExist):
+            return None
+
+    def owns(self, flat):
+        """
+               Checks if the flat (object or id) belongs to the landlord without querying the flats
+        """
+        if flat is None:
+            return False
+        try:
+            return int(getattr(flat, 'id_flat', flat)) in self.owned_ids
+        except (TypeError, ValueError):
+            return False
+
+
+class FlatContextMiddleware:
+    """
+           Adds request.flats (FlatContext) to the requests of the authenticated users
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            request.flats = FlatContext(request)
+        return self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+           Measures every request: latency, number and time of the SQL queries and template rendering time.
+            - aggregates the measurements per URL name in the metrics registry (see the 'metrics' view)
+            - adds X-Request-Time, X-DB-Queries, X-DB-Time, X-Template-Time headers in the debug mode,
+              except the streaming responses measured when their content is sent
+            - logs the requests slower than SLOW_REQUEST_MS with their most repeated SQL statements
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.samples = getattr(settings, 'REQUEST_METRICS_SAMPLES', 1000)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        if response.streaming and not response.is_async:
+            # the content of a streaming response (e.g. the CSV exports) is generated and queries the database
+            # while it is sent, so the request is recorded when the content is exhausted or closed
+            response.streaming_content = self.measure_content(request, stats, start, response.streaming_content)
+            return response
+        latency = time.perf_counter() - start
+        if settings.DEBUG:
+            response['X-Request-Time'] = f'{latency * 1000:.1f}'
+            response['X-DB-Queries'] = str(stats.queries)
+            response['X-DB-Time'] = f'{stats.db_time * 1000:.1f}'
+            response['X-Template-Time'] = f'{stats.template_time * 1000:.1f}'
+        self.record(request, stats, latency)
+        return response
+
+    def measure_content(self, request, stats, start, content):
+        """
+               Streams the content counting its queries in the statistics of the request
+        """
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                yield from content
+        finally:
+            self.record(request, stats, time.perf_counter() - start)
+
+    def record(self, request, stats, latency):
+        match = request.resolver_match
+        name = match.url_name if match is not None and match.url_name else 'unresolved'
+        registry.record(name, latency, stats, self.samples)
+        if self.slow_ms is not None and latency * 1000 > self.slow_ms:
+            repeated = ''.join(f'\n    {n} x {sql}' for sql, n in stats.repeated())
+            logger.warning('Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in DB, %.1f ms in templates%s',
+                           request.method, request.path, name, latency * 1000, stats.queries,
+                           stats.db_time * 1000, stats.template_time * 1000, repeated)
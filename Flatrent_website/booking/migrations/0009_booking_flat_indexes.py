@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_alter_calendar_id_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flat',
+            name='link_sites',
+            field=models.CharField(max_length=45, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='flat',
+            name='link_tenants',
+            field=models.CharField(max_length=45, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['id_flat', 'checkin_date', 'checkout_date', 'id_status'], name='booking_flat_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calendar',
+            index=models.Index(fields=['id_flat', 'is_available', 'date'], name='calendar_flat_available_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_booking_flat_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Occupancy',
+            fields=[
+                ('id_occupancy', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('is_booked', models.IntegerField()),
+                ('price', models.FloatField()),
+                ('id_booking', models.ForeignKey(blank=True, db_column='id_booking', null=True, on_delete=django.db.models.deletion.SET_NULL, to='booking.booking')),
+                ('id_flat', models.ForeignKey(db_column='id_flat', on_delete=django.db.models.deletion.CASCADE, to='booking.flat')),
+                ('id_source', models.ForeignKey(blank=True, db_column='id_source', null=True, on_delete=django.db.models.deletion.SET_NULL, to='booking.source')),
+            ],
+            options={
+                'db_table': 'occupancy',
+                'managed': True,
+                'unique_together': {('id_flat', 'date')},
+            },
+        ),
+    ]
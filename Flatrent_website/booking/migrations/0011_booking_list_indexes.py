@@ -0,0 +1,25 @@
+# Generated by Django 4.2.2 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['id_flat', 'booking_date', 'id_booking'], name='booking_flat_booked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['id_flat', 'checkin_date', 'id_booking'], name='booking_flat_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['id_flat', 'id_status', 'id_booking'], name='booking_flat_status_idx'),
+        ),
+    ]
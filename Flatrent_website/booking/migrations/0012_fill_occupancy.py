@@ -0,0 +1,48 @@
+import datetime
+
+from django.db import migrations
+
+
+def fill_occupancy(apps, schema_editor):
+    """
+           Fills the daily occupancy of all the flats from the calendars and the bookings, as
+           booking.occupancy.rebuild_occupancy does, with the historical models and without the cache
+    """
+    Flat = apps.get_model('booking', 'Flat')
+    Calendar = apps.get_model('booking', 'Calendar')
+    Booking = apps.get_model('booking', 'Booking')
+    Occupancy = apps.get_model('booking', 'Occupancy')
+    for id_flat in Flat.objects.order_by('id_flat').values_list('id_flat', flat=True):
+        prices = dict(Calendar.objects.filter(id_flat=id_flat).values_list('date', 'base_price'))
+        booked = {}
+        for id_booking, id_source, checkin, checkout, price in Booking.objects.filter(id_flat=id_flat). \
+                exclude(id_status=3).order_by('id_booking'). \
+                values_list('id_booking', 'id_source', 'checkin_date', 'checkout_date', 'price'):
+            days = [checkin + datetime.timedelta(days=i) for i in range((checkout - checkin).days)]
+            # discount of the booking on the base prices of its days, see booking.prices.booking_discount
+            base_total = sum(prices.get(day, 0) for day in days)
+            discount = int(100 * (base_total - price) / base_total) if base_total else 0
+            for day in days:
+                # the first booking is kept if bookings overlap
+                booked.setdefault(day, (id_booking, id_source, discount))
+        rows = []
+        for date, base_price in sorted(prices.items()):
+            if date in booked:
+                id_booking, id_source, discount = booked[date]
+                rows.append(Occupancy(id_flat_id=id_flat, date=date, is_booked=1, id_booking_id=id_booking,
+                                      id_source_id=id_source, price=base_price * (100 - discount) / 100))
+            else:
+                rows.append(Occupancy(id_flat_id=id_flat, date=date, is_booked=0, price=base_price))
+        Occupancy.objects.filter(id_flat=id_flat).delete()
+        Occupancy.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_booking_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
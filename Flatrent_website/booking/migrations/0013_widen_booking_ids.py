@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0012_fill_occupancy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='id_booking',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='bookingtenant',
+            name='id_booking_tenant',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -5,12 +5,14 @@
 #   * Make sure each ForeignKey and OneToOneField has `on_delete` set to the desired behavior
 #   * Remove `managed = False` lines if you wish to allow Django to create, modify, and delete the table
 # Feel free to rename the models, but don't rename db_table values or field names.
-from django.db import models
+import datetime
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
 class Booking(models.Model):
-    id_booking = models.SmallAutoField(primary_key=True)
+    id_booking = models.BigAutoField(primary_key=True)
     id_flat = models.ForeignKey('Flat', models.CASCADE, db_column='id_flat')
     id_source = models.ForeignKey('Source', models.CASCADE, db_column='id_source')
     id_status = models.ForeignKey('Status', models.CASCADE, db_column='id_status')
@@ -24,6 +26,113 @@ class Booking(models.Model):
     class Meta:
         managed = True
         db_table = 'booking'
+        indexes = [
+            models.Index(fields=['id_flat', 'checkin_date', 'checkout_date', 'id_status'],
+                         name='booking_flat_dates_idx'),
+            # keyset pagination of the booking list
+            models.Index(fields=['id_flat', 'booking_date', 'id_booking'], name='booking_flat_booked_idx'),
+            models.Index(fields=['id_flat', 'checkin_date', 'id_booking'], name='booking_flat_checkin_idx'),
+            models.Index(fields=['id_flat', 'id_status', 'id_booking'], name='booking_flat_status_idx'),
+        ]
+
+class CalendarManager(models.Manager):
+    def seed(self, flat, start, end, base_price=0, min_nights_amount=0, is_available=1, batch_size=500):
+        """
+               Creates the calendar days of the flat for the period [start, end) with bulk inserts
+               in one transaction. The days that are already in the calendar are kept as is
+
+               INPUT
+               ---------
+               flat(int): id of the flat
+               start(date): first day
+               end(date): day after the last day
+               base_price(int): base price of the new days. 0 by default
+               min_nights_amount(int): min booking period of the new days. 0 by default
+               is_available(int): 1 - open, 0 - closed. Open by default
+               batch_size(int): number of days inserted by one query
+
+               OUTPUT
+               ---------------------
+               days_number(int): number of days in the period
+        """
+        from .api import invalidate_availability
+        from .prices import invalidate_price_index
+
+        flat = getattr(flat, 'id_flat', flat)
+        days = [self.model(date=start + datetime.timedelta(days=i), id_flat_id=flat, base_price=base_price,
+                           min_nights_amount=min_nights_amount, is_available=is_available)
+                for i in range((end - start).days)]
+        with transaction.atomic():
+            self.bulk_create(days, batch_size=batch_size, ignore_conflicts=True)
+        # bulk inserts don't send the signals
+        invalidate_price_index(flat)
+        invalidate_availability(flat)
+        return len(days)
+
+    def update_range(self, flats, start, end, **values):
+        """
+               Sets the values to all the days of the period [start, end) of the given flats with one UPDATE query
+
+               INPUT
+               ---------
+               flats(list(int)): ids of the flats
+               start(date): first day
+               end(date): day after the last day
+               values: field values to set
+
+               OUTPUT
+               ---------------------
+               days_number(int): number of updated days
+        """
+        from .api import invalidate_availability
+
+        flats = [getattr(flat, 'id_flat', flat) for flat in flats]
+        with transaction.atomic():
+            days_number = self.filter(id_flat__in=flats, date__gte=start, date__lt=end).update(**values)
+        # updates don't send the signals
+        for flat in flats:
+            transaction.on_commit(lambda flat=flat: invalidate_availability(flat))
+        return days_number
+
+    def close_dates(self, flats, start, end):
+        """
+               Closes the period [start, end) for booking in the calendars of the given flats
+        """
+        return self.update_range(flats, start, end, is_available=0)
+
+    def open_dates(self, flats, start, end):
+        """
+               Opens the period [start, end) for booking in the calendars of the given flats
+        """
+        return self.update_range(flats, start, end, is_available=1)
+
+    def set_params(self, flats, start, end, base_price=None, min_nights_amount=None):
+        """
+               Sets the base price and(or) the min booking period to the period [start, end) of the given flats.
+               The parameters that are None are not changed. The daily occupancy of the flats is updated
+               in the same transaction, the cached price indexes are dropped after the commit
+        """
+        from .occupancy import refresh_occupancy
+        from .prices import PriceIndex, invalidate_price_index
+
+        values = {}
+        if base_price is not None:
+            values['base_price'] = base_price
+        if min_nights_amount is not None:
+            values['min_nights_amount'] = min_nights_amount
+        if not values:
+            return 0
+        flats = [getattr(flat, 'id_flat', flat) for flat in flats]
+        with transaction.atomic():
+            days_number = self.update_range(flats, start, end, **values)
+            if 'base_price' in values:
+                for flat in flats:
+                    # the cache must not keep the prices of a transaction that may be rolled back, so the occupancy
+                    # is calculated with an uncached index of the new prices
+                    refresh_occupancy(flat, start, end, price_index=PriceIndex.build(flat))
+                    transaction.on_commit(lambda flat=flat: invalidate_price_index(flat))
+        return days_number
+
 
 class Calendar(models.Model):
     id_date = models.AutoField(primary_key=True)
@@ -33,10 +142,15 @@ class Calendar(models.Model):
     min_nights_amount = models.IntegerField()
     is_available = models.IntegerField()
 
+    objects = CalendarManager()
+
     class Meta:
         managed = True
         db_table = 'calendar'
         unique_together = (('date', 'id_flat'),)
+        indexes = [
+            models.Index(fields=['id_flat', 'is_available', 'date'], name='calendar_flat_available_idx'),
+        ]
 
 class Source(models.Model):
     id_source = models.AutoField(primary_key=True)
@@ -64,8 +178,8 @@ class Flat(models.Model):
     address = models.CharField(max_length=100)
     add_date = models.DateField(auto_now_add=True)
     edit_date = models.DateField(auto_now=True)
-    link_sites = models.CharField(max_length=45)
-    link_tenants = models.CharField(max_length=45)
+    link_sites = models.CharField(max_length=45, unique=True)
+    link_tenants = models.CharField(max_length=45, unique=True)
     comment = models.CharField(max_length=300, blank=True, null=True)
     source = models.ManyToManyField('Source', related_name="sour", through='FlatSource')
     discount = models.ManyToManyField('Discount', related_name="disc", through='FlatDiscount')
@@ -113,6 +227,10 @@ class Status(models.Model):
         db_table = 'status'
 
 
+# statuses of the bookings, id_status 3 (cancelled) is excluded from the occupancy
+STATUSES = {1: 'Завершен', 2: 'Ожидается', 3: 'Отменен', 4: 'В процессе'}
+
+
 class Tenant(models.Model):
     phone = models.CharField(primary_key=True, max_length=20)
     name = models.CharField(max_length=30)
@@ -124,10 +242,24 @@ class Tenant(models.Model):
 
 
 class BookingTenant(models.Model):
-    id_booking_tenant = models.SmallAutoField(primary_key=True)
+    id_booking_tenant = models.BigAutoField(primary_key=True)
     id_booking = models.ForeignKey('Booking', models.CASCADE, db_column='id_booking')
     phone = models.ForeignKey('Tenant', models.CASCADE, db_column='phone')
 
     class Meta:
         managed = True
-        db_table = 'booking_tenant'
\ No newline at end of file
+        db_table = 'booking_tenant'
+
+class Occupancy(models.Model):
+    id_occupancy = models.AutoField(primary_key=True)
+    id_flat = models.ForeignKey('Flat', models.CASCADE, db_column='id_flat')
+    date = models.DateField()
+    is_booked = models.IntegerField()
+    id_booking = models.ForeignKey('Booking', models.SET_NULL, db_column='id_booking', blank=True, null=True)
+    id_source = models.ForeignKey('Source', models.SET_NULL, db_column='id_source', blank=True, null=True)
+    price = models.FloatField()
+
+    class Meta:
+        managed = True
+        db_table = 'occupancy'
+        unique_together = (('id_flat', 'date'),)
@@ -0,0 +1,85 @@
+import datetime
+
+from django.db import transaction
+
+from .availability import to_date
+from .models import Booking, Calendar, Flat, Occupancy
+from .prices import get_price_index, booking_discount
+from .stats import invalidate_statistics
+
+
+def refresh_occupancy(flat, d1, d2, price_index=None):
+    """
+           Recalculates the daily occupancy of the flat for the period [d1, d2).
+           The period is extended to the bookings overlapping it, as the discount of a booking (and so the
+           effective price of all its days) depends on the base prices of the whole booking
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           d1(date): start day
+           d2(date): end day
+           price_index(PriceIndex): price index of the flat. None - the cached index
+    """
+    flat = getattr(flat, 'id_flat', flat)
+    if not Flat.objects.filter(id_flat=flat).exists():
+        # the flat is deleted, its occupancy is deleted with it
+        return
+    d1, d2 = to_date(d1), to_date(d2)
+    bookings = Booking.objects.filter(id_flat=flat).exclude(id_status=3)
+    bounds = list(bookings.filter(checkin_date__lt=d2, checkout_date__gt=d1).
+                  values_list('checkin_date', 'checkout_date'))
+    if bounds:
+        d1 = min([d1] + [checkin for checkin, checkout in bounds])
+        d2 = max([d2] + [checkout for checkin, checkout in bounds])
+    book_list = bookings.filter(checkin_date__lt=d2, checkout_date__gt=d1).order_by('id_booking'). \
+        values_list('id_booking', 'id_source', 'checkin_date', 'checkout_date', 'price')
+
+    if price_index is None:
+        price_index = get_price_index(flat)
+    booked = {}
+    for id_booking, id_source, checkin, checkout, price in book_list:
+        discount = booking_discount(price_index.total(checkin, checkout), price)
+        day = max(checkin, d1)
+        while day < min(checkout, d2):
+            # the first booking is kept if bookings overlap
+            booked.setdefault(day, (id_booking, id_source, discount))
+            day += datetime.timedelta(days=1)
+
+    rows = []
+    for date, base_price in Calendar.objects.filter(id_flat=flat, date__gte=d1, date__lt=d2). \
+            values_list('date', 'base_price'):
+        if date in booked:
+            id_booking, id_source, discount = booked[date]
+            rows.append(Occupancy(id_flat_id=flat, date=date, is_booked=1, id_booking_id=id_booking,
+                                  id_source_id=id_source, price=base_price * (100 - discount) / 100))
+        else:
+            rows.append(Occupancy(id_flat_id=flat, date=date, is_booked=0, price=base_price))
+    with transaction.atomic():
+        Occupancy.objects.filter(id_flat=flat, date__gte=d1, date__lt=d2).delete()
+        Occupancy.objects.bulk_create(rows, batch_size=500)
+    invalidate_statistics(flat, d1)
+
+
+def rebuild_occupancy(flat=None):
+    """
+           Rebuilds the daily occupancy from scratch for the flat or for all the flats
+
+           INPUT
+           ---------
+           flat(int): id of the flat. None - all the flats
+
+           OUTPUT
+           ---------------------
+           flats_number(int): number of rebuilt flats
+    """
+    flat_list = Flat.objects.all()
+    if flat is not None:
+        flat_list = flat_list.filter(id_flat=getattr(flat, 'id_flat', flat))
+    flats_number = 0
+    for id_flat in flat_list.values_list('id_flat', flat=True):
+        with transaction.atomic():
+            Occupancy.objects.filter(id_flat=id_flat).delete()
+            refresh_occupancy(id_flat, datetime.date.min, datetime.date.max)
+        flats_number += 1
+    return flats_number
@@ -0,0 +1,119 @@
+from array import array
+import datetime
+
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .availability import to_date
+from .models import Calendar
+
+# the index is dropped by invalidate_price_index on every price change, the timeout only limits memory usage
+PRICE_INDEX_TIMEOUT = 24 * 60 * 60
+
+
+class PriceIndex:
+    """
+           Cumulative base prices of one flat indexed by the day offset from the first calendar day:
+           sums[i] is the total base price of the days before start + i. Days missing in the calendar cost 0.
+
+           INPUT
+           ---------
+           start(date): first day of the calendar
+           sums(array): cumulative prices, one item longer than the calendar
+    """
+
+    def __init__(self, start, sums):
+        self.start = start
+        self.sums = sums
+
+    @classmethod
+    def build(cls, flat):
+        """
+               Builds the index from the calendar of the flat with one query
+        """
+        days_list = Calendar.objects.filter(id_flat=flat).order_by('date').values_list('date', 'base_price')
+        sums = array('l', [0])
+        start = None
+        for date, base_price in days_list:
+            if start is None:
+                start = date
+            # fills the gaps in the calendar with zero prices
+            while len(sums) <= (date - start).days:
+                sums.append(sums[-1])
+            sums.append(sums[-1] + base_price)
+        return cls(start, sums)
+
+    def offset(self, day):
+        return min(max((day - self.start).days, 0), len(self.sums) - 1)
+
+    def total(self, d1, d2):
+        """
+               Total base price of the period [d1, d2)
+        """
+        if self.start is None:
+            return 0
+        o1, o2 = self.offset(to_date(d1)), self.offset(to_date(d2))
+        if o2 <= o1:
+            return 0
+        return self.sums[o2] - self.sums[o1]
+
+
+def price_index_key(flat):
+    return f'price_index:{getattr(flat, "id_flat", flat)}'
+
+
+def get_price_index(flat):
+    """
+           Returns the price index of the flat, the index is built on the first use and kept in the cache
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+
+           OUTPUT
+           ---------------------
+           index(PriceIndex): price index
+    """
+    key = price_index_key(flat)
+    index = cache.get(key)
+    if index is None:
+        index = PriceIndex.build(flat)
+        cache.set(key, index, PRICE_INDEX_TIMEOUT)
+    return index
+
+
+def invalidate_price_index(flat):
+    """
+           Drops the cached price index of the flat. Has to be called after every change of the base prices
+    """
+    cache.delete(price_index_key(flat))
+
+
+def with_base_price(book_list):
+    """
+           Annotates the bookings with the total base price of their periods ('base_total'),
+           calculated by the database in the same query as a correlated sum over the calendar
+
+           INPUT
+           ---------
+           book_list(QuerySet): bookings
+
+           OUTPUT
+           ---------------------
+           book_list(QuerySet): annotated bookings
+    """
+    base_total = Calendar.objects.filter(id_flat=OuterRef('id_flat'), date__gte=OuterRef('checkin_date'),
+                                         date__lt=OuterRef('checkout_date')). \
+        order_by().values('id_flat').annotate(total=Sum('base_price')).values('total')
+    return book_list.annotate(base_total=Coalesce(Subquery(base_total), Value(0)))
+
+
+def booking_discount(base_total, price):
+    """
+           Discount of the booking in percent on the base of the actual booking price and the total base price
+           of its period. 0 if there are no base prices for the period
+    """
+    if base_total:
+        return int(100 * (base_total - price) / base_total)
+    return 0
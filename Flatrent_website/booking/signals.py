@@ -0,0 +1,76 @@
+import datetime
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Booking, Calendar, Flat, FlatDiscount
+from .availability import to_date
+from .api import invalidate_availability, invalidate_public_flat
+from .ical import invalidate_ical
+from .middleware import invalidate_owned_flats
+from .occupancy import refresh_occupancy
+from .prices import invalidate_price_index
+
+
+@receiver(post_save, sender=Calendar)
+def calendar_changed(sender, instance, **kwargs):
+    invalidate_price_index(instance.id_flat_id)
+    invalidate_availability(instance.id_flat_id)
+    day = to_date(instance.date)
+    refresh_occupancy(instance.id_flat_id, day, day + datetime.timedelta(days=1))
+
+
+@receiver(post_delete, sender=Calendar)
+def calendar_deleted(sender, instance, **kwargs):
+    # the occupancy of the deleted days is kept: it is the history of the statistics and the old days
+    # are deleted from the calendar by extend_calendar
+    invalidate_price_index(instance.id_flat_id)
+    invalidate_availability(instance.id_flat_id)
+
+
+@receiver(post_save, sender=FlatDiscount)
+@receiver(post_delete, sender=FlatDiscount)
+def discount_changed(sender, instance, **kwargs):
+    # discounts are a part of the quotes of the public API
+    invalidate_availability(instance.id_flat_id)
+
+
+@receiver(pre_save, sender=Booking)
+def booking_saving(sender, instance, **kwargs):
+    # remembers the period before editing to free its days in the occupancy
+    instance.saved_period = None
+    if instance.pk is not None:
+        instance.saved_period = Booking.objects.filter(pk=instance.pk). \
+            values_list('id_flat', 'checkin_date', 'checkout_date').first()
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):
+    if instance.saved_period is not None:
+        refresh_occupancy(*instance.saved_period)
+        invalidate_ical(instance.saved_period[0])
+        invalidate_availability(instance.saved_period[0])
+    refresh_occupancy(instance.id_flat_id, instance.checkin_date, instance.checkout_date)
+    invalidate_ical(instance.id_flat_id)
+    invalidate_availability(instance.id_flat_id)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, origin=None, **kwargs):
+    period = (instance.id_flat_id, instance.checkin_date, instance.checkout_date)
+    if isinstance(origin, Booking) or getattr(origin, 'model', None) is Booking:
+        refresh_occupancy(*period)
+    else:
+        # a cascade delete, e.g. of the flat: the flat may be deleted later in the same transaction,
+        # so the occupancy is refreshed after the commit if the flat still exists
+        transaction.on_commit(lambda: refresh_occupancy(*period))
+    invalidate_ical(instance.id_flat_id)
+    invalidate_availability(instance.id_flat_id)
+
+
+@receiver(post_save, sender=Flat)
+@receiver(post_delete, sender=Flat)
+def flat_changed(sender, instance, **kwargs):
+    invalidate_owned_flats(instance.id_landlord_id)
+    invalidate_public_flat(instance.link_tenants)
@@ -0,0 +1,200 @@
+import datetime
+import functools
+import importlib.metadata
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import ExtractMonth
+
+from .models import Booking, Occupancy
+
+MONTHS = ['Янв', 'Фев', 'Март', 'Апр', 'Май', 'Июнь', 'Июль', 'Авг', 'Сент', 'Окт', 'Нояб', 'Дек']
+# figures of the closed years are dropped by invalidate_statistics, the timeout only limits memory usage
+STATISTICS_TIMEOUT = 30 * 24 * 60 * 60
+
+# numpy, pandas and plotly take most of the worker start-up time and are needed by the statistics page only,
+# so they are imported by the functions on the first use
+
+
+def year_statistics(flat, year):
+    """
+           Calculates the monthly statistics of the flat for the given year with two queries:
+           the daily occupancy of the year grouped by months and the non-cancelled bookings touching the year
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           year(int): year
+
+           OUTPUT
+           ---------------------
+           stats(dict): series of 12 months - 'income', 'av_day_price', 'load' (%), 'booking_number',
+           'av_period' (nights), and 'sources' - dictionary {'source name': number of bookings in the year}
+    """
+    import numpy as np
+    import pandas as pd
+
+    first_day = datetime.date(year, 1, 1)
+    last_day = datetime.date(year, 12, 31)
+    months = pd.DataFrame(list(Occupancy.objects.filter(id_flat=flat, date__gte=first_day, date__lte=last_day).
+                               annotate(month=ExtractMonth('date')).values('month').
+                               annotate(days=Count('id_occupancy'), busy=Sum('is_booked'),
+                                        income=Sum('price', filter=Q(is_booked=1))).
+                               values_list('month', 'days', 'busy', 'income')),
+                          columns=['month', 'days', 'busy', 'income']). \
+        set_index('month').reindex(range(1, 13)).fillna(0)
+    books = pd.DataFrame(list(Booking.objects.filter(id_flat=flat, checkin_date__lte=last_day,
+                                                     checkout_date__gte=first_day).exclude(id_status=3).
+                              order_by('id_booking').
+                              values_list('checkin_date', 'checkout_date', 'id_source__name')),
+                         columns=['checkin', 'checkout', 'source'])
+    checkin = books['checkin'].to_numpy(dtype='datetime64[D]')
+    checkout = books['checkout'].to_numpy(dtype='datetime64[D]')
+
+    # a booking belongs to the months of its check-in and check-out
+    nights = (checkout - checkin).astype(int)
+    in_month = np.zeros((12, len(books)), dtype=bool)
+    for dates in (checkin, checkout):
+        dates = pd.DatetimeIndex(dates)
+        in_year = dates.year == year
+        in_month[dates.month[in_year] - 1, np.flatnonzero(in_year)] = True
+    booking_number = in_month.sum(axis=1)
+    tot_nights = in_month @ nights
+
+    days_in_month = months['days'].to_numpy(dtype=float)
+    has_days = days_in_month > 0
+    busy = months['busy'].to_numpy(dtype=float)
+    income = months['income'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        av_day_price = np.where(busy > 0, income / busy, 0)
+        load = np.where(has_days, np.trunc(100 * busy / days_in_month), 0)
+        av_period = np.where(booking_number > 0, tot_nights / booking_number, 0)
+
+    in_year = in_month.any(axis=0)
+    sources = books['source'][in_year].value_counts(sort=False)
+    return {'income': income.tolist(),
+            'av_day_price': av_day_price.tolist(),
+            'load': load.astype(int).tolist(),
+            'booking_number': np.where(has_days, booking_number, 0).tolist(),
+            'av_period': np.where(has_days, av_period, 0).tolist(),
+            'sources': sources.to_dict()}
+
+
+def statistics_version_key(flat):
+    return f'statistics_version:{getattr(flat, "id_flat", flat)}'
+
+
+def statistics_version(flat):
+    """
+           Version of the flat's closed years statistics. A new version is issued after every invalidate_statistics,
+           so all the cached figures of the flat become stale at once
+    """
+    version = cache.get(statistics_version_key(flat))
+    if version is None:
+        version = time.time_ns()
+        cache.set(statistics_version_key(flat), version, None)
+    return version
+
+
+def invalidate_statistics(flat, d1=None):
+    """
+           Drops the cached figures of the closed years of the flat. Has to be called after every change of the
+           occupancy, the change of the current and next years only doesn't touch the cache
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           d1(date): first changed day, None - the whole history
+    """
+    if d1 is None or d1.year < datetime.date.today().year:
+        cache.delete(statistics_version_key(flat))
+
+
+def bar_figure(values, colors, title):
+    import plotly.graph_objs as go
+
+    fig = go.Figure([go.Bar(x=MONTHS, y=values, marker_color=colors)])
+    fig.update_layout(title=title, title_x=0.5)
+    return fig
+
+
+def build_figures(flat, year, today):
+    """
+           Renders the statistics figures of the flat for the year to HTML divs without plotly.js,
+           the library is loaded by the page once (see plotly_bundle)
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           year(int): year
+           today(date): current day, the past months are colored differently
+
+           OUTPUT
+           ---------------------
+           figures(dict): 'income', 'avprice', 'load', 'booknumber', 'avperiod', 'source' - HTML divs
+    """
+    import plotly.graph_objs as go
+
+    stats = year_statistics(flat, year)
+    source_dict = stats['sources']
+    colors = ['#528B8B' if (month < today.month and year == today.year) or year < today.year else '#8B2252'
+              for month in range(1, 13)]
+
+    fig_source = go.Figure(data=[go.Pie(labels=list(source_dict.keys()), values=list(source_dict.values()))])
+    fig_source.update_layout(title='Источники', title_x=0.5)
+    figures = {'income': bar_figure(stats['income'], colors, f'Доход, р. (Общий {sum(stats["income"])} р.)'),
+               'avprice': bar_figure(stats['av_day_price'], colors, 'Средняя стоимость суток, р.'),
+               'load': bar_figure(stats['load'], colors, 'Загрузка, %'),
+               'booknumber': bar_figure(stats['booking_number'], colors,
+                                        f'Кол-во бронирований, шт. (Общее {sum(source_dict.values())} шт.)'),
+               'avperiod': bar_figure(stats['av_period'], colors, 'Средний срок аренды, дн.'),
+               'source': fig_source}
+    return {name: fig.to_html(include_plotlyjs=False, full_html=False) for name, fig in figures.items()}
+
+
+def statistics_figures(flat, year, today=None):
+    """
+           Returns the statistics figures of the flat for the year (see build_figures).
+           Figures of the closed years don't change and are kept in the cache
+
+           INPUT
+           ---------
+           flat(int): id of the flat
+           year(int): year
+           today(date): current day
+
+           OUTPUT
+           ---------------------
+           figures(dict): HTML divs of the figures
+    """
+    today = today or datetime.date.today()
+    if year >= today.year:
+        return build_figures(flat, year, today)
+    key = f'statistics:{flat}:{year}:{statistics_version(flat)}'
+    figures = cache.get(key)
+    if figures is None:
+        figures = build_figures(flat, year, today)
+        cache.set(key, figures, STATISTICS_TIMEOUT)
+    return figures
+
+
+@functools.lru_cache(maxsize=None)
+def plotly_version():
+    # from the package metadata, without importing plotly
+    return importlib.metadata.version('plotly')
+
+
+@functools.lru_cache(maxsize=None)
+def plotly_bundle():
+    """
+           plotly.js of the installed plotly version, read once per process
+
+           OUTPUT
+           ---------------------
+           content(str): minified plotly.js
+           etag(str): quoted version of plotly
+    """
+    import plotly.offline
+
+    return plotly.offline.get_plotlyjs(), f'"plotly-{plotly_version()}"'
@@ -0,0 +1,72 @@
+import datetime
+import io
+import locale
+import threading
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TransactionTestCase
+
+from .availability import search_flats
+from .models import Flat
+from .views import free_windows, month_dict
+
+THREADS = 16
+REQUESTS = 10
+
+
+class OpenLinkConcurrencyTest(TransactionTestCase):
+    """
+        Hammers the tenants page from many threads as a threaded WSGI server does: every thread shows its own month
+        and searches the dates, the pages must not mix up the months and must not change the process locale
+    """
+
+    def setUp(self):
+        cache.clear()
+        call_command('generate_data', landlords=1, flats=1, seed=25, stdout=io.StringIO())
+        self.flat = Flat.objects.get()
+        today = datetime.date.today()
+        # the first free period that can be booked
+        self.period = None
+        for window in free_windows(today, today + datetime.timedelta(days=180), self.flat):
+            day = window['start']
+            while self.period is None and day < window['end']:
+                found = search_flats([self.flat.id_flat], day, window['end'])
+                if found:
+                    self.period = (day, window['end'], found[0]['price'])
+                day += datetime.timedelta(days=1)
+            if self.period is not None:
+                break
+        self.assertIsNotNone(self.period)
+
+    def hammer(self, number, errors):
+        client = Client()
+        day1, day2, price = self.period
+        year = datetime.date.today().year
+        month = number % 12 + 1
+        try:
+            for _ in range(REQUESTS):
+                response = client.post(f'/open_link/{self.flat.link_tenants}',
+                                       {'cal_year': year, 'cal_month': month, 'start_date': day1, 'end_date': day2,
+                                        'searchdates': ''})
+                content = response.content.decode()
+                if response.status_code != 200:
+                    errors.append(f'thread {number}: status {response.status_code}')
+                elif f'{month_dict[month]} {year}' not in content or f'value="{price}"' not in content:
+                    errors.append(f'thread {number}: the page of another request')
+        except Exception as error:
+            errors.append(f'thread {number}: {error!r}')
+        finally:
+            connection.close()
+
+    def test_open_link(self):
+        process_locale = locale.setlocale(locale.LC_ALL)
+        errors = []
+        threads = [threading.Thread(target=self.hammer, args=(number, errors)) for number in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(locale.setlocale(locale.LC_ALL), process_locale)
@@ -0,0 +1,74 @@
+import csv
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .export import BOOKING_HEADER, CALENDAR_HEADER
+from .metrics import registry
+from .models import Landlord, Status, Source, Flat, Calendar, Booking, BookingTenant, Tenant
+
+
+class ExportTest(TestCase):
+    """
+        Downloads the CSV exports of the bookings and the calendar
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('landlord', password='password')
+        landlord = Landlord.objects.create(id_landlord=user)
+        status = Status.objects.create(id_status=2, name='Ожидается')
+        source = Source.objects.create(name='Avito')
+        cls.flat = Flat.objects.create(id_landlord=landlord, name='Flat', address='Address',
+                                       link_sites='site-token', link_tenants='tenant-token')
+        cls.day = datetime.date(2026, 7, 1)
+        Calendar.objects.bulk_create([Calendar(date=cls.day + datetime.timedelta(days=i), id_flat=cls.flat,
+                                               base_price=1000, min_nights_amount=1, is_available=1)
+                                      for i in range(10)])
+        booking = Booking.objects.create(id_flat=cls.flat, id_source=source, id_status=status, price=2700,
+                                         checkin_date=cls.day + datetime.timedelta(days=2),
+                                         checkout_date=cls.day + datetime.timedelta(days=5), comment='Поздний заезд')
+        # late evening in UTC, the next day in Moscow
+        Booking.objects.filter(pk=booking.pk).update(
+            booking_date=datetime.datetime(2026, 6, 20, 22, 30, tzinfo=datetime.timezone.utc))
+        tenant = Tenant.objects.create(phone='79000000001', name='Иван')
+        BookingTenant.objects.create(id_booking=booking, phone=tenant)
+        cls.booking = booking
+
+    def setUp(self):
+        self.client.login(username='landlord', password='password')
+
+    def download(self, url):
+        response = self.client.get(url, {'flat': self.flat.id_flat})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(content[1:].splitlines(), delimiter=';'))
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_bookings(self):
+        rows = self.download('/export/bookings')
+        self.assertEqual(rows[0], BOOKING_HEADER)
+        self.assertEqual(rows[1:], [[str(self.booking.id_booking), 'Flat', '2026-07-03', '2026-07-06', '3', '2700',
+                                     '10', 'Ожидается', 'Avito', 'Иван', '79000000001', '2026-06-21',
+                                     'Поздний заезд']])
+
+    def test_calendar(self):
+        rows = self.download('/export/calendar')
+        self.assertEqual(rows[0], CALENDAR_HEADER)
+        self.assertEqual(len(rows), 1 + 10)
+        self.assertEqual(rows[1], ['Flat', '2026-07-01', '1000', '1', '1', '0', '', ''])
+
+    def test_metrics(self):
+        # the queries of the streamed rows are counted in the request metrics
+        registry.reset()
+        with CaptureQueriesContext(connection) as context:
+            self.download('/export/bookings')
+        self.assertEqual(registry.snapshot()['export_bookings']['queries']['max'], len(context))
@@ -0,0 +1,66 @@
+import datetime
+import io
+import os
+import tempfile
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from .management.commands.import_bookings import COLUMNS
+from .models import Landlord, Flat, Calendar, Booking, BookingTenant, Tenant, Occupancy
+
+
+class ImportBookingsTest(TestCase):
+    """
+        Imports a small historical CSV: new and existing tenants, a duplicate row and a repeated import
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('landlord', password='password')
+        landlord = Landlord.objects.create(id_landlord=user)
+        cls.flat = Flat.objects.create(id_landlord=landlord, name='Flat', address='Address',
+                                       link_sites='site-token', link_tenants='tenant-token')
+        Tenant.objects.create(phone='79000000001', name='Старое Имя')
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        rows = [['иван', '+7 900 000-00-01', 'avito', '01.03.2023', '04.03.2023', '7500', '2500', '1', '15.02.2023'],
+                ['Мария', '79000000002', 'Booking', '10.03.2023', '17.03.2023', '17500', '2500', '1', '01.03.2023'],
+                # the same booking again
+                ['Мария', '79000000002', 'Booking', '10.03.2023', '17.03.2023', '17500', '2500', '1', '01.03.2023'],
+                ['Олег', '79000000003', 'Avito', '20.03.2023', '22.03.2023', '5000', '2500', '3', '18.03.2023']]
+        pd.DataFrame(rows, columns=COLUMNS).to_csv(self.path, index=False, encoding='utf-16')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def import_bookings(self):
+        call_command('import_bookings', self.path, flat=self.flat.id_flat, stdout=io.StringIO())
+
+    def test_import(self):
+        self.import_bookings()
+        book_list = Booking.objects.filter(id_flat=self.flat).order_by('checkin_date')
+        self.assertEqual([(book.checkin_date, book.checkout_date, book.price, book.id_source.name,
+                           book.id_status_id) for book in book_list],
+                         [(datetime.date(2023, 3, 1), datetime.date(2023, 3, 4), 7500, 'Avito', 1),
+                          (datetime.date(2023, 3, 10), datetime.date(2023, 3, 17), 17500, 'Booking', 1),
+                          (datetime.date(2023, 3, 20), datetime.date(2023, 3, 22), 5000, 'Avito', 3)])
+        self.assertEqual(book_list[0].booking_date.date(), datetime.date(2023, 2, 15))
+        # the existing tenant is renamed, the new ones are created
+        self.assertEqual(dict(Tenant.objects.values_list('phone', 'name')),
+                         {'79000000001': 'Иван', '79000000002': 'Мария', '79000000003': 'Олег'})
+        self.assertEqual(sorted(BookingTenant.objects.filter(id_booking__id_flat=self.flat).
+                                values_list('id_booking__checkin_date', 'phone')),
+                         [(datetime.date(2023, 3, 1), '79000000001'), (datetime.date(2023, 3, 10), '79000000002'),
+                          (datetime.date(2023, 3, 20), '79000000003')])
+        # the calendar days of the bookings and their occupancy
+        self.assertEqual(Calendar.objects.filter(id_flat=self.flat).count(), 3 + 7 + 2)
+        self.assertEqual(Occupancy.objects.filter(id_flat=self.flat, is_booked=1).count(), 3 + 7)
+
+        self.import_bookings()
+        self.assertEqual(Booking.objects.filter(id_flat=self.flat).count(), 3)
+        self.assertEqual(Tenant.objects.count(), 3)
@@ -0,0 +1,236 @@
+import datetime
+import io
+import json
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .availability import search_flats
+from .models import Flat, Booking, Calendar
+from .prices import get_price_index
+from .views import period_is_available, calculate_price, check_discount, show_calendar, free_windows
+
+# upper bounds of the number of SQL queries, a view or a helper issuing more queries fails the tests
+QUERY_BUDGETS = json.loads((Path(__file__).parent / 'query_budgets.json').read_text())
+
+
+class QueryBudgetTest(TestCase):
+    """
+        Checks that the hot views and helpers stay within their query budgets (booking/query_budgets.json)
+        on a fixed synthetic dataset
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', landlords=2, flats=2, seed=16, stdout=io.StringIO())
+        cls.flat = Flat.objects.order_by('id_flat').first()
+        cls.today = datetime.date.today()
+        cls.booking = Booking.objects.filter(id_flat=cls.flat, checkin_date__gt=cls.today). \
+            exclude(id_status=3).order_by('checkin_date').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username=self.flat.id_landlord.id_landlord.username, password='password')
+
+    def assertQueryBudget(self, name, func, *args, **kwargs):
+        budget = QUERY_BUDGETS[name]
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(len(context), budget,
+                             f'{name}: {len(context)} queries, the budget is {budget}\n{queries}')
+        return result
+
+    def get(self, name, url, data=None, status_code=200):
+        response = self.assertQueryBudget(name, self.client.get, url, data)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def post(self, name, url, data, status_code=200):
+        response = self.assertQueryBudget(name, self.client.post, url, data)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def month(self):
+        return {'flat': self.flat.id_flat, 'cal_year': self.today.year, 'cal_month': self.today.month}
+
+    # helpers
+
+    def test_period_is_available(self):
+        self.assertQueryBudget('period_is_available', period_is_available, self.today,
+                               self.today + datetime.timedelta(days=30), self.flat)
+
+    def test_calculate_price(self):
+        self.assertQueryBudget('calculate_price', calculate_price, self.today,
+                               self.today + datetime.timedelta(days=30), self.flat)
+
+    def test_check_discount(self):
+        self.assertQueryBudget('check_discount', check_discount, self.today,
+                               self.today + datetime.timedelta(days=30), self.flat)
+
+    def test_show_calendar(self):
+        self.assertQueryBudget('show_calendar', show_calendar, self.today.month, self.today.year, self.flat.id_flat)
+
+    def test_free_windows(self):
+        day2 = self.today + datetime.timedelta(days=90)
+        windows = self.assertQueryBudget('free_windows', free_windows, self.today, day2, self.flat)
+        self.assertTrue(windows)
+        for window in windows:
+            self.assertTrue(period_is_available(window['start'], window['end'], self.flat))
+            self.assertEqual(window['tot_price'], calculate_price(window['start'], window['end'], self.flat))
+
+    # views
+
+    def test_home(self):
+        self.get('home', '/')
+
+    def test_calendar_month(self):
+        self.get('calendar_month', '/calendar/month', {'flat': self.flat.id_flat})
+
+    def test_calendar_month_set_params(self):
+        # the first free week after the booking
+        day1 = self.booking.checkout_date
+        while not period_is_available(day1, day1 + datetime.timedelta(days=7), self.flat, edit=1):
+            day1 += datetime.timedelta(days=1)
+        day2 = day1 + datetime.timedelta(days=6)
+        data = dict(self.month(), start_date=day1, end_date=day2, setparams='', price='2500', nights_amount='2')
+        get_price_index(self.flat.id_flat)
+        # the cached price index is dropped after the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('calendar_month_set_params', '/calendar/month', data)
+        self.assertFalse(Calendar.objects.filter(id_flat=self.flat, date__gte=day1, date__lte=day2).
+                         exclude(base_price=2500).exists())
+        self.assertEqual(get_price_index(self.flat.id_flat).total(day1, day2 + datetime.timedelta(days=1)), 7 * 2500)
+        # the values that are not numbers are not saved
+        response = self.client.post('/calendar/month', dict(data, price='2 500 р.'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'целыми положительными числами')
+        self.assertFalse(Calendar.objects.filter(id_flat=self.flat, date__gte=day1, date__lte=day2).
+                         exclude(base_price=2500).exists())
+
+    def test_booking_check(self):
+        self.get('booking_check', '/booking/check', {'flat': self.flat.id_flat})
+
+    def test_booking_check_booked_dates(self):
+        data = dict(self.month(), start_date=self.booking.checkin_date, end_date=self.booking.checkout_date,
+                    searchdates='')
+        self.post('booking_check_search', '/booking/check', data)
+
+    def test_booking_check_free_dates(self):
+        window = next(window for window in free_windows(self.today, self.today + datetime.timedelta(days=180),
+                                                        self.flat)
+                      if search_flats([self.flat.id_flat], window['start'], window['end']))
+        data = dict(self.month(), start_date=window['start'], end_date=window['end'], searchdates='')
+        response = self.post('booking_check_free_dates', '/booking/check', data)
+        self.assertEqual(response.context['result'], 'success')
+        self.assertEqual(response.context['price'], window['price'])
+
+    def test_booking_add(self):
+        day1 = self.today + datetime.timedelta(days=200)
+        self.get('booking_add', '/booking/add', {'flat': self.flat.id_flat, 'start_date': day1,
+                                                 'end_date': day1 + datetime.timedelta(days=3), 'price': 3000,
+                                                 'tot_price': 3000, 'discount': 0})
+
+    def test_booking_search(self):
+        day1 = self.booking.checkin_date
+        response = self.get('booking_search', '/booking/search', {'start_date': day1,
+                                                                  'end_date': day1 + datetime.timedelta(days=7)})
+        found = [item['flat'] for item in response.context['found']]
+        self.assertNotIn(self.flat.id_flat, found)
+        for flat in Flat.objects.filter(id_landlord=self.flat.id_landlord):
+            if flat.id_flat in found:
+                self.assertTrue(period_is_available(day1, day1 + datetime.timedelta(days=7), flat))
+
+    def test_calendar_windows(self):
+        response = self.get('calendar_windows', '/calendar/windows', {'months': 12})
+        flat, windows = response.context['flat_windows'][0]
+        window = windows[0]
+        # the booking link of the window pre-fills its dates
+        link = f"/booking/check?flat={flat.id_flat}&start_date={window['start']}&end_date={window['end']}"
+        self.assertContains(response, link)
+        response = self.get('booking_check', link)
+        self.assertContains(response, f'value="{window["start"]}"')
+        self.assertContains(response, f'value="{window["end"]}"')
+        self.assertEqual((response.context['year'], response.context['month']),
+                         (window['start'].year, window['start'].month))
+
+    def test_booking_list(self):
+        response = self.get('booking_list', '/booking/list', {'flat': self.flat.id_flat})
+        self.assertTrue(response.context['next_query'])
+        self.get('booking_list', f"/booking/list?{response.context['next_query']}")
+
+    def test_booking_list_post(self):
+        # the sort form of the old pages
+        response = self.post('booking_list', '/booking/list', {'flat': self.flat.id_flat, 'sorttype': 2, 'sort': ''})
+        self.assertEqual(response.context['filters']['sort'], 2)
+        page = [book.id_booking for book in response.context['book_list']]
+        by_status = self.get('booking_list', '/booking/list', {'flat': self.flat.id_flat, 'sort': 2})
+        by_date = self.get('booking_list', '/booking/list', {'flat': self.flat.id_flat})
+        self.assertEqual(page, [book.id_booking for book in by_status.context['book_list']])
+        self.assertNotEqual(page, [book.id_booking for book in by_date.context['book_list']])
+
+    def test_booking_edit(self):
+        self.get('booking_edit', f'/booking/booking_edit/{self.booking.id_booking}', {'flat': self.flat.id_flat})
+
+    def test_statistics(self):
+        self.get('statistics', '/statistics', {'flat': self.flat.id_flat})
+
+    def test_settings(self):
+        self.get('settings', '/settings', {'flat': self.flat.id_flat})
+
+    def test_open_link(self):
+        self.get('open_link', f'/open_link/{self.flat.link_tenants}')
+
+    def test_site_link(self):
+        response = self.get('site_link', f'/site_link/{self.flat.link_sites}')
+        self.assertQueryBudget('site_link_not_modified', self.client.get, f'/site_link/{self.flat.link_sites}',
+                               HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_api_month(self):
+        self.client.logout()
+        url = f'/api/flats/{self.flat.link_tenants}/month'
+        response = self.get('api_month', url, {'year': self.booking.checkin_date.year,
+                                               'month': self.booking.checkin_date.month})
+        days = {day['date']: day['status'] for week in response.json()['weeks'] for day in week}
+        self.assertEqual(days[self.booking.checkin_date.isoformat()], 'booked')
+        self.assertQueryBudget('api_month_cached', self.client.get, url, {'year': self.booking.checkin_date.year,
+                                                                          'month': self.booking.checkin_date.month})
+        response = self.assertQueryBudget('api_month_cached', self.client.get, url,
+                                          {'year': self.booking.checkin_date.year,
+                                           'month': self.booking.checkin_date.month},
+                                          HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        for data in ({'year': self.today.year + 10, 'month': 12}, {'year': 9999, 'month': 12},
+                     {'year': self.today.year, 'month': 13}, {'year': 'next'}):
+            self.assertEqual(self.client.get(url, data).status_code, 400)
+
+    def test_api_month_closed_booked_day(self):
+        # a booked day closed by the landlord has the same status in the API and on the server-rendered page
+        day = self.booking.checkin_date
+        Calendar.objects.filter(id_flat=self.flat, date=day).update(is_available=0)
+        self.client.logout()
+        response = self.client.get(f'/api/flats/{self.flat.link_tenants}/month', {'year': day.year, 'month': day.month})
+        days = {day['date']: day['status'] for week in response.json()['weeks'] for day in week}
+        statuses = {obj.date.isoformat(): status for week in show_calendar(day.month, day.year, self.flat.id_flat)
+                    for obj, status in week.items() if obj is not None}
+        self.assertEqual(days[day.isoformat()], 'closed')
+        self.assertEqual({date: status for date, status in days.items() if status != 'none'}, statuses)
+
+    def test_api_quote(self):
+        self.client.logout()
+        url = f'/api/flats/{self.flat.link_tenants}/quote'
+        data = {'start_date': self.booking.checkin_date, 'end_date': self.booking.checkout_date}
+        self.assertFalse(self.get('api_quote', url, data).json()['available'])
+        self.assertQueryBudget('api_quote_cached', self.client.get, url, data)
+        # a change of the bookings drops the cached answers
+        Booking.objects.get(pk=self.booking.pk).save()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, data)
+        self.assertTrue(len(context))
+        far = self.today.replace(year=self.today.year + 10, day=1)
+        self.assertEqual(self.client.get(url, {'start_date': far, 'end_date': far + datetime.timedelta(days=3)}).
+                         status_code, 400)
@@ -1,3 +1,105 @@
+import datetime
+import io
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from unittest import skipUnless
+
+from .models import Landlord, Status, Source, Flat, Calendar, Booking, Occupancy
+from .views import period_is_available
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is checked for SQLite')
+class IndexUsageTest(TestCase):
+    """
+        Checks that the hot queries are answered by the composite indexes instead of full scans
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('landlord', password='password')
+        landlord = Landlord.objects.create(id_landlord=user)
+        status = Status.objects.create(id_status=2, name='Ожидается')
+        Status.objects.create(id_status=3, name='Отменен')
+        source = Source.objects.create(name='Avito')
+        cls.flat = Flat.objects.create(id_landlord=landlord, name='Flat', address='Address',
+                                       link_sites='site-token', link_tenants='tenant-token')
+        today = datetime.date.today()
+        Calendar.objects.bulk_create([Calendar(date=today + datetime.timedelta(days=i), id_flat=cls.flat,
+                                               base_price=1000, min_nights_amount=1, is_available=1)
+                                      for i in range(60)])
+        Booking.objects.create(id_flat=cls.flat, id_source=source, id_status=status, price=3000,
+                               checkin_date=today + datetime.timedelta(days=3),
+                               checkout_date=today + datetime.timedelta(days=6))
+
+    def query_plans(self, queries, table):
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and f'FROM "{table}"' in sql:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plans.append(' '.join(row[-1] for row in cursor.fetchall()))
+        self.assertTrue(plans, f'No queries to the table {table}')
+        return plans
+
+    def test_period_is_available(self):
+        today = datetime.date.today()
+        with CaptureQueriesContext(connection) as context:
+            period_is_available(today, today + datetime.timedelta(days=10), self.flat.id_flat)
+        for plan in self.query_plans(context.captured_queries, 'booking'):
+            self.assertIn('booking_flat_dates_idx', plan)
+        for plan in self.query_plans(context.captured_queries, 'calendar'):
+            self.assertIn('calendar_flat_available_idx', plan)
+
+    def test_site_link(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/site_link/site-token.ics')
+        self.assertEqual(response.status_code, 200)
+        for plan in self.query_plans(context.captured_queries, 'flat'):
+            self.assertIn('USING INDEX', plan)
+            self.assertIn('link_sites=?', plan)
+
+    def test_open_link(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/open_link/tenant-token')
+        self.assertEqual(response.status_code, 200)
+        for plan in self.query_plans(context.captured_queries, 'flat'):
+            self.assertIn('USING INDEX', plan)
+            self.assertIn('link_tenants=?', plan)
+
+
+class FlatDeleteTest(TestCase):
+    """
+        Deletes a flat with its calendar, bookings and occupancy
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', landlords=1, flats=2, seed=6, stdout=io.StringIO())
+        cls.flat = Flat.objects.order_by('id_flat').first()
+
+    def test_settings_delete(self):
+        self.assertTrue(Booking.objects.filter(id_flat=self.flat).exists())
+        self.assertTrue(Occupancy.objects.filter(id_flat=self.flat).exists())
+        self.client.login(username=self.flat.id_landlord.id_landlord.username, password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(f'/settings/delete/{self.flat.id_flat}', {'flat': self.flat.id_flat})
+        self.assertEqual(response.status_code, 302)
+        connection.check_constraints()
+        self.assertFalse(Flat.objects.filter(pk=self.flat.pk).exists())
+        for model in (Calendar, Booking, Occupancy):
+            self.assertFalse(model.objects.filter(id_flat=self.flat.pk).exists())
+        # the other flat of the landlord is untouched
+        self.assertTrue(Occupancy.objects.exclude(id_flat=self.flat.pk).exists())
 
-# Create your tests here.
+    def test_booking_delete(self):
+        booking = Booking.objects.filter(id_flat=self.flat).exclude(id_status=3).order_by('checkin_date').last()
+        self.assertTrue(Occupancy.objects.filter(id_booking=booking, is_booked=1).exists())
+        booking.delete()
+        # a booking deleted by itself frees its days at once
+        self.assertFalse(Occupancy.objects.filter(id_flat=self.flat, date__gte=booking.checkin_date,
+                                                  date__lt=booking.checkout_date, is_booked=1).exists())
@@ -6,16 +6,24 @@ urlpatterns = [
     path('calendar/month', views.calendar_month, name="calendar_month"),
     path('booking/list', views.booking_list, name="booking_list"),
     path('statistics', views.statistics, name="statistics"),
+    path('plotly.js', views.plotly_js, name="plotly_js"),
     path('settings', views.settings, name="settings"),
     path('settings/add', views.settings_add, name="settings_add"),
     path('profile/edit', views.profile_edit, name="profile_edit"),
     path('booking/check', views.booking_check, name="booking_check"),
     path('booking/add', views.booking_add, name="booking_add"),
+    path('booking/search', views.booking_search, name="booking_search"),
+    path('calendar/windows', views.calendar_windows, name="calendar_windows"),
     path('booking/booking_edit/<booking_id>', views.booking_edit, name="booking_edit"),
     path('booking/booking_delete/<booking_id>', views.booking_delete, name="booking_delete"),
     path('settings/delete/<flat_id>', views.settings_delete, name="settings_delete"),
     path('settings/edit/<flat_id>', views.settings_edit, name="settings_edit"),
     path('open_link/<token>', views.open_link, name="open_link"),
     path('site_link/<token>', views.site_link, name="site_link"),
+    path('api/flats/<token>/month', views.api_month, name="api_month"),
+    path('api/flats/<token>/quote', views.api_quote, name="api_quote"),
+    path('metrics', views.metrics, name="metrics"),
+    path('export/bookings', views.export_bookings, name="export_bookings"),
+    path('export/calendar', views.export_calendar, name="export_calendar"),
 
 ]
\ No newline at end of file
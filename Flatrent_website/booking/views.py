@@ -1,23 +1,44 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponseRedirect, Http404, HttpResponse
+from django.http import HttpResponseRedirect, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.forms import modelformset_factory
-from django.utils.datastructures import MultiValueDictKeyError
 from django.db.models import Q
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
 from .models import *
 from .forms import *
+from .availability import FlatAvailability, search_flats, find_free_windows, to_date
+from .prices import get_price_index, with_base_price, booking_discount
+from .stats import statistics_figures, plotly_bundle, plotly_version
+from .occupancy import refresh_occupancy
+from .ical import get_ical
+from .api import get_public_flat, month_availability, quote, AVAILABILITY_MAX_AGE
+from .metrics import registry, metrics_text
+from .export import booking_rows, calendar_rows, csv_lines
 import datetime
-import calendar, locale
-from dateutil.relativedelta import *
-import plotly
-import plotly.graph_objs as go
+import calendar
+import os
 import secrets
-import icalendar
 
+# booking list: number of bookings on the page and sort fields of the sort types
+BOOKING_PAGE_SIZE = 20
+BOOKING_SORT_FIELDS = {0: 'booking_date', 1: 'checkin_date', 2: 'id_status'}
+
+# free windows: default number of months of the view
+WINDOW_MONTHS = 3
+
+# public API: max period of the quote and the years before and after the current one the answers are given for,
+# so the clients can't fill the cache with arbitrary dates
+API_MAX_NIGHTS = 365
+API_YEARS = 2
+
+# names of the months and days of the week (date.weekday()) in Russian, the views don't depend on the locale
+# of the process, so they are safe in threaded servers
 month_dict = {1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель", 5: "Май", 6: "Июнь",
               7: "Июль", 8: "Август", 9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"}
+day_dict = {0: "ПН", 1: "ВТ", 2: "СР", 3: "ЧТ", 4: "ПТ", 5: "СБ", 6: "ВС"}
 
 def user_in_base(tel):
     """
@@ -70,33 +91,43 @@ def period_is_available(d1, d2, flat, exc=None, edit=0):
            edit(bool): indicates if the function is called during the calendar edit (closing or opening dates).
            In this case checking is performed without taking into account the dates statuses from the calendar.
            Disabled by default.
+           Builds a FlatAvailability index of the period only, views checking several periods should build
+           the index of their whole window once and reuse it.
 
            OUTPUT
            ---------------------
            False: non-available
            True: available
     """
-    booking_list_flat = Booking.objects.filter(id_flat=flat)
-    if exc is not None:
-        booking_list = booking_list_flat.filter(checkin_date__lte=d1, checkout_date__gt=d1). \
-            exclude(id_booking=exc).exclude(id_status=3)
-        booking_list2 = booking_list_flat.filter(checkin_date__gt=d1, checkin_date__lt=d2). \
-            exclude(id_booking=exc).exclude(id_status=3)
-    else:
-        booking_list = booking_list_flat.filter(checkin_date__lte=d1, checkout_date__gt=d1).exclude(id_status=3)
-        booking_list2 = booking_list_flat.filter(checkin_date__gt=d1, checkin_date__lt=d2).exclude(id_status=3)
-    if edit == 0:
-        days_list = Calendar.objects.filter(is_available=0, date__gte=d1, date__lt=d2, id_flat=flat)
-    else:
-        days_list = []
-    if days_list or booking_list or booking_list2:
-        return False
-    return True
+    d1, d2 = to_date(d1), to_date(d2)
+    # an empty or inverted period is checked on its first day
+    end = max(d2, d1 + datetime.timedelta(days=1))
+    return FlatAvailability(flat, start=d1, end=end, closed_days=(edit == 0)).is_available(d1, d2, exc=exc, edit=edit)
+
+
+def free_windows(d1, d2, flat):
+    """
+           Finds all the maximal free windows of the given object(flat) in the specified period
+           that can be booked taking into account the min booking period of the days (see find_free_windows)
+
+           INPUT
+           ---------
+           d1(date): start day
+           d2(date): end day
+           flat(int): id of the flat
+
+           OUTPUT
+           ---------------------
+           windows(list): windows - dictionaries 'start', 'end', 'nights', 'tot_price', 'discount', 'price'
+    """
+    flat = getattr(flat, 'id_flat', flat)
+    return find_free_windows([flat], d1, d2)[flat]
 
 
 def calculate_price(d1, d2, flat):
     """
-           Calculates the total price of the given period on the base of base prices in the calendar
+           Calculates the total price of the given period on the base of base prices in the calendar.
+           The price is taken from the cached cumulative prices of the flat (see PriceIndex)
            INPUT
            ---------
            d1(date):  start day
@@ -107,12 +138,7 @@ def calculate_price(d1, d2, flat):
            ---------------------
            tot_price(int): total price
     """
-    days_list = Calendar.objects.filter(date__gte=d1, date__lt=d2, id_flat=flat)
-    price_list = days_list.values('base_price')
-    tot_price = 0
-    for obj in list(price_list):
-        tot_price += obj['base_price']
-    return int(tot_price)
+    return int(get_price_index(flat).total(d1, d2))
 
 
 def check_discount(d1, d2, flat):
@@ -126,44 +152,96 @@ def check_discount(d1, d2, flat):
 
            OUTPUT
            ---------------------
-           disc_obj.id_discount.discount (int): discount value
+           discount (int): discount value of the longest suitable period
            0: if there are not any available discounts
     """
     nights = (d2 - d1).days
-    disc_flat = FlatDiscount.objects.filter(id_flat=flat)
-    disc_obj = disc_flat.filter(id_discount__nights_amount__lte=nights)
-    if disc_obj:
-        disc_obj = disc_obj.order_by('-id_discount__nights_amount')[0]
-        return disc_obj.id_discount.discount
+    discount = FlatDiscount.objects.filter(id_flat=flat, id_discount__nights_amount__lte=nights). \
+        order_by('-id_discount__nights_amount').values_list('id_discount__discount', flat=True).first()
+    return discount or 0
+
+def bookings_with_discount(b_list, limit=None):
+    """
+           Loads the bookings with their statuses, sources and tenants and sets to every booking the discount provided
+           during the booking (attribute 'discount') on the base of the actual booking price and base price
+           from the calendar. The number of queries doesn't depend on the number of bookings
+
+           INPUT
+           ---------
+           b_list(QuerySet):  bookings
+           limit(int): max number of bookings to load. None - all the bookings
+
+           OUTPUT
+           ---------------------
+           book_list (list): bookings with discounts
+    """
+    b_list = with_base_price(b_list).select_related('id_status', 'id_source').prefetch_related('tenant')
+    if limit is not None:
+        b_list = b_list[:limit]
+    book_list = list(b_list)
+    for book in book_list:
+        book.discount = booking_discount(book.base_total, book.price)
+    return book_list
+
+
+def booking_key(book, field):
+    """
+           Key of the booking in the list sorted by the field: 'value_id'
+    """
+    value = book.serializable_value(field)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    return f'{value}_{book.id_booking}'
+
+
+def parse_booking_key(key, field):
+    """
+           Parses the key made by booking_key
+
+           OUTPUT
+           ---------------------
+           value: value of the sort field
+           id_booking(int): id of the booking
+    """
+    value, id_booking = key.rsplit('_', 1)
+    if field == 'booking_date':
+        value = datetime.datetime.fromisoformat(value)
+    elif field == 'checkin_date':
+        value = datetime.date.fromisoformat(value)
     else:
-        return 0
+        value = int(value)
+    return value, int(id_booking)
+
 
-def calc_booking_discount(b_list, flat):
+def bookings_page(b_list, sort_type, after=None, page_size=BOOKING_PAGE_SIZE):
     """
-           Calculates the discount provided during the booking on the base of the actual booking price and base price
-           from the calendar
+           Selects one page of the bookings sorted in descending order by the field of the sort type
+           with id_booking as a tiebreaker. The page starts after the key of the last booking of the previous page
+           (keyset pagination), so any page costs the same as the first one
 
            INPUT
            ---------
-           b_list(QuerySet):  bookings of the specified object
-           flat(int): id of the object the calculation is performed for
+           b_list(QuerySet):  bookings
+           sort_type(int): 0 - by booking date, 1 - by check-in date, 2 - by status
+           after(str): key of the last booking of the previous page. None - the first page
+           page_size(int): number of bookings on the page
 
-           Возвращаемое значение
+           OUTPUT
            ---------------------
-           disc_dict (dict): dictionary {'booking object': discount}
-    """
-    disc_dict = {}
-    for book in b_list:
-        start_day = book.checkin_date
-        end_day = book.checkout_date
-        price = int(book.price)
-        tot_price = calculate_price(start_day, end_day, flat)
-        if tot_price != 0:
-            discount = 100 * (tot_price - price) / tot_price
-            disc_dict[book.id_booking] = int(discount)
-        else:
-            disc_dict[book.id_booking] = 0
-    return disc_dict
+           book_list(list): bookings of the page with discounts
+           next_key(str): key to get the next page, None if the page is the last one
+    """
+    field = BOOKING_SORT_FIELDS[sort_type]
+    b_list = b_list.order_by(f'-{field}', '-id_booking')
+    if after:
+        value, id_booking = parse_booking_key(after, field)
+        b_list = b_list.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id_booking__lt': id_booking}))
+    book_list = bookings_with_discount(b_list, limit=page_size + 1)
+    next_key = None
+    if len(book_list) > page_size:
+        book_list = book_list[:page_size]
+        next_key = booking_key(book_list[-1], field)
+    return book_list, next_key
 
 
 def switch_month(request, year, month):
@@ -194,16 +272,19 @@ def switch_month(request, year, month):
     return year, month
 
 
-def show_calendar(month, year, flat):
+def show_calendar(month, year, flat, availability=None):
     """
            Generates a list of weeks for the given month, year and object. Each week is a dictionary {'date': status}
-           Status: 1 - available, 0 - booked, 2 - not in the calendar
+           Status: 'free', 'booked', 'closed' or 'none' - not in the calendar, see FlatAvailability.day_status
+           The calendar days and the bookings of the visible period are loaded once, statuses are computed in memory
 
            INPUT
            ---------
            year(int):  year
            month(int): month
            flat(int): id of the object the calculation is performed for
+           availability(FlatAvailability): availability index of the flat if it is already built for the request.
+           None by default
 
            OUTPUT
            ---------------------
@@ -211,20 +292,18 @@ def show_calendar(month, year, flat):
     """
     dates_list = calendar.Calendar()
     dates_list = dates_list.monthdatescalendar(year, month)
+    first_day = dates_list[0][0]
+    last_day = dates_list[-1][-1]
+    days_dict = {obj.date: obj for obj in Calendar.objects.filter(id_flat=flat, date__gte=first_day,
+                                                                  date__lte=last_day)}
+    if availability is None:
+        availability = FlatAvailability(flat, first_day, last_day + datetime.timedelta(days=1), closed_days=False)
     obj_list = []
     for week in dates_list:
         week_obj_dict = {}
         for day in week:
-            try:
-                obj = Calendar.objects.get(date=day, id_flat=flat)
-                if period_is_available(day, day, flat, edit=1):
-                    status = 1
-                else:
-                    status = 0
-            except Calendar.DoesNotExist:
-                obj = None
-                status = 2
-            week_obj_dict[obj] = status
+            obj = days_dict.get(day)
+            week_obj_dict[obj] = availability.day_status(day, None if obj is None else obj.is_available)
         obj_list.append(week_obj_dict)
     return obj_list
 
@@ -235,8 +314,7 @@ def home(request):
         Home page view, sets selected_flat
     """
     if request.user.is_authenticated:
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
+        flat_list = request.flats.flat_list
         # if the flat list is not empty the first flat is chosen
         if list(flat_list):
             selected_flat = flat_list[0]
@@ -256,66 +334,54 @@ def calendar_month(request):
     """
     if request.user.is_authenticated:
         date = datetime.datetime.now().date()
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
+        flat_list = request.flats.flat_list
         form = CheckDataForm(request.POST or None)
+        selected_flat = request.flats.selected
         if request.method == "GET":
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
             year = date.year
             month = date.month
         if request.POST:
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
             year = int(request.POST["cal_year"])
             month = int(request.POST["cal_month"])
             day1 = request.POST["start_date"]
             day2 = request.POST["end_date"]
             # adds 1 day to the day2 as "period_is_available" doesn't take into account the last day
-            day2_calc = convert_date(day2) + relativedelta(days=1)
+            day2_calc = convert_date(day2) + datetime.timedelta(days=1)
         # checks if the user has an access
-        if selected_flat in flat_list:
+        if request.flats.owns(selected_flat):
             if request.POST:
                 if "nextmonth" in request.POST or "prevmonth" in request.POST:
                     updated_data = switch_month(request, year, month)
                     year, month = updated_data[0], updated_data[1]
                 else:
                     if period_is_available(day1, day2_calc, selected_flat, edit=1):
-                        days_list = Calendar.objects.filter(date__gte=day1, date__lt=day2_calc,
-                                                            id_flat=selected_flat.id_flat)
                         if "closedates" in request.POST:
-                            for day in days_list:
-                                day.is_available = 0
-                                day.save()
-                                form = CheckDataForm({"start_date": day1, "end_date": day2})
+                            Calendar.objects.close_dates([selected_flat], day1, day2_calc)
+                            form = CheckDataForm({"start_date": day1, "end_date": day2})
                         elif "opendates" in request.POST:
-                            for day in days_list:
-                                day.is_available = 1
-                                day.save()
-                                form = CheckDataForm({"start_date": day1, "end_date": day2})
+                            Calendar.objects.open_dates([selected_flat], day1, day2_calc)
+                            form = CheckDataForm({"start_date": day1, "end_date": day2})
                         elif "setparams" in request.POST:
-                            base_price = request.POST["price"]
-                            min_nights_amount = request.POST["nights_amount"]
-                            for day in days_list:
-                                if base_price:
-                                    day.base_price = base_price
-                                if min_nights_amount:
-                                    day.min_nights_amount = min_nights_amount
-                                day.save()
+                            params_form = CalendarParamsForm(request.POST)
+                            if params_form.is_valid():
+                                Calendar.objects.set_params([selected_flat], day1, day2_calc,
+                                                            base_price=params_form.cleaned_data["price"],
+                                                            min_nights_amount=params_form.cleaned_data["nights_amount"])
+                            else:
+                                messages.success(request, "Цена и минимальный срок бронирования должны быть "
+                                                          "целыми положительными числами")
                             form = CheckDataForm({"start_date": day1, "end_date": day2,
-                                                  "price": base_price, "nights_amount": min_nights_amount})
+                                                  "price": request.POST.get("price"),
+                                                  "nights_amount": request.POST.get("nights_amount")})
                     else:
                         messages.success(request, "В указанный период есть бронирование")
 
             calend = show_calendar(month, year, selected_flat.id_flat)
             return render(request, 'booking/calendar_month_edit.html', {"year": year, "month": month,
                                                                         "month_name": month_dict[month],
+                                                                        "day_names": day_dict.values(),
                                                                         "date": date, "form": form, "flat_list": flat_list,
                                                                         "selected_flat": selected_flat, "calendar": calend})
-
-            # locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
-            # return render(request, 'booking/calendar_month_edit.html', {"year": year, "month": month,
-            #                                                             "month_name": list(calendar.month_name)[month],
-            #                                                             "date": date, "form": form, "flat_list": flat_list,
-            #                                                             "selected_flat": selected_flat, "calendar": calend})
         else:
             raise Http404('У Вас нет доступа')
     return redirect('login')
@@ -326,28 +392,34 @@ def booking_check(request):
          - Check if the period is available
          - Calculates price and discount for available dates
          - Redirects to the booking page if dates are available and user submits
+         - Pre-fills the dates of a free window (?start_date=&end_date=, see calendar_windows)
          The dates can be checked only if the user is a landlord of the selected flat
     """
     if request.user.is_authenticated:
         date = datetime.datetime.now().date()
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
+        flat_list = request.flats.flat_list
         result = 'none'
         form = CheckDataForm(request.POST or None)
         source_list = Source.objects.order_by('name').all()
+        selected_flat = request.flats.selected
+        window = None
         if request.method == "GET":
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
             year = date.year
             month = date.month
+            window_form = CheckDataForm(request.GET)
+            if window_form.is_valid() and window_form.cleaned_data['end_date'] > window_form.cleaned_data['start_date']:
+                day1 = window_form.cleaned_data['start_date']
+                window = (day1.isoformat(), window_form.cleaned_data['end_date'].isoformat())
+                # the calendar shows the month of the window
+                year, month = day1.year, day1.month
         if request.method == "POST":
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
             year = int(request.POST["cal_year"])
             month = int(request.POST["cal_month"])
             start_date = request.POST['start_date']
             end_date = request.POST['end_date']
             day1 = convert_date(start_date)
             day2 = convert_date(end_date)
-        if selected_flat in flat_list:
+        if request.flats.owns(selected_flat):
             if request.method == "POST":
                 if "nextmonth" in request.POST or "prevmonth" in request.POST:
                     updated_data = switch_month(request, year, month)
@@ -358,17 +430,21 @@ def booking_check(request):
                         if day2 > day1 >= date:
                             min_nights = Calendar.objects.filter(date=start_date, id_flat=selected_flat.id_flat). \
                                 values('min_nights_amount')
-                            if (day2-day1).days >= min_nights[0]['min_nights_amount']:
-                                if period_is_available(day1, day2, selected_flat):
+                            if not min_nights:
+                                result = 'nonavailable'
+                                messages.success(request, "Даты недоступны")
+                            elif (day2-day1).days >= min_nights[0]['min_nights_amount']:
+                                availability = FlatAvailability(selected_flat)
+                                if availability.is_available(day1, day2):
                                     tot_price = calculate_price(day1, day2, selected_flat)
                                     discount = check_discount(day1, day2, selected_flat)
                                     price = int(tot_price * (100 - discount) / 100)
                                     result = 'success'
-                                    calend = show_calendar(month, year, selected_flat.id_flat)
-                                    # locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
+                                    calend = show_calendar(month, year, selected_flat.id_flat, availability)
                                     return render(request, 'booking/booking_check.html',
                                                   {"year": year, "month": month,
-                                                   "month_name": month_dict[month][month], "form": form,
+                                                   "month_name": month_dict[month], "form": form,
+                                                   "day_names": day_dict.values(),
                                                    "result": result, "price": price, "discount": discount,
                                                    "source_list": source_list, "tot_price": tot_price, "date": date,
                                                    "selected_flat": selected_flat, "flat_list": flat_list,
@@ -394,21 +470,64 @@ def booking_check(request):
             calend = show_calendar(month, year, selected_flat.id_flat)
             return render(request, 'booking/booking_check.html', {"year": year, "month": month,
                                                                   "month_name": month_dict[month],
+                                                                  "day_names": day_dict.values(),
                                                                   "date": date, "form": form, "result": result,
+                                                                  "window": window,
                                                                   "source_list": source_list, "flat_list": flat_list,
                                                                   "selected_flat": selected_flat, "calendar": calend, })
-
-            # shows months in Russian
-            # locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
-            # return render(request, 'booking/booking_check.html', {"year": year, "month": month,
-            #                                                       "month_name": list(calendar.month_name)[month],
-            #                                                       "date": date, "form": form, "result": result,
-            #                                                       "source_list": source_list, "flat_list": flat_list,
-            #                                                       "selected_flat": selected_flat, "calendar": calend,})
         else:
             raise Http404('У Вас нет доступа')
     return redirect('login')
 
+def booking_search(request):
+    """
+        Booking search view:
+         - Finds all the landlord's flats free for the period with the total price, discount and final price
+         - Filters the flats by the max price
+         - Links every found flat to the booking page
+    """
+    if request.user.is_authenticated:
+        date = datetime.datetime.now().date()
+        form = FlatSearchForm(request.GET if 'start_date' in request.GET else None,
+                              initial={'start_date': date, 'end_date': date + datetime.timedelta(days=1)})
+        found = None
+        if form.is_valid():
+            day1 = form.cleaned_data['start_date']
+            day2 = form.cleaned_data['end_date']
+            if day2 > day1 >= date:
+                found = search_flats(sorted(request.flats.owned_ids), day1, day2, form.cleaned_data['max_price'])
+            else:
+                messages.success(request, "Даты введены неверно")
+        return render(request, 'booking/booking_search.html', {"form": form, "found": found, "date": date,
+                                                               "flat_list": request.flats.flat_list,
+                                                               "selected_flat": request.flats.selected})
+    return redirect('login')
+
+def calendar_windows(request):
+    """
+        Free windows view:
+         - Shows all the free windows of the landlord's flats for the next months (3 by default, up to 12)
+           with their base prices, discounts and final prices
+         - Links every window to the booking page
+    """
+    if request.user.is_authenticated:
+        date = datetime.datetime.now().date()
+        try:
+            months = min(max(int(request.GET.get('months', WINDOW_MONTHS)), 1), 12)
+        except ValueError:
+            months = WINDOW_MONTHS
+        from dateutil.relativedelta import relativedelta
+        end_date = date + relativedelta(months=months)
+        windows = find_free_windows(sorted(request.flats.owned_ids), date, end_date)
+        flat_list = request.flats.flat_list
+        flat_windows = [(flat, windows[flat.id_flat]) for flat in flat_list if flat.id_flat in windows]
+        return render(request, 'booking/calendar_windows.html', {"flat_windows": flat_windows, "months": months,
+                                                                 "month_choices": range(1, 13),
+                                                                 "date": date, "end_date": end_date,
+                                                                 "flat_list": flat_list,
+                                                                 "selected_flat": request.flats.selected})
+    return redirect('login')
+
 def booking_add(request):
     """
         Booking add view:
@@ -419,14 +538,13 @@ def booking_add(request):
          The booking can be saved only if the user is a landlord of the selected flat
     """
     if request.user.is_authenticated:
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
+        flat_list = request.flats.flat_list
         calc_type = 'price'
         form = CheckDataForm(request.POST or None)
         form1 = BookingForm(request.POST or None)
         form2 = TenantForm(request.POST or None)
+        selected_flat = request.flats.selected
         if request.method == "GET":
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
             start_date = request.GET["start_date"]
             end_date = request.GET["end_date"]
             price = request.GET["price"]
@@ -447,7 +565,6 @@ def booking_add(request):
             data_form = {'discount': discount}
             form = CheckDataForm(data_form)
         if request.method == "POST":
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
             name = request.POST['name']
             phone = request.POST['phone']
             start_date = request.POST['checkin_date']
@@ -461,7 +578,7 @@ def booking_add(request):
             year = convert_date(start_date).year
             month = convert_date(start_date).month
 
-        if selected_flat in flat_list:
+        if request.flats.owns(selected_flat):
             if request.method == "POST":
                 if "nextmonth" in request.POST or "prevmonth" in request.POST:
                     updated_data = switch_month(request, year, month)
@@ -525,23 +642,17 @@ def booking_add(request):
                         form2 = TenantForm(data_form2)
                         messages.success(request, "Неправильно указан телефон!")
 
-            source_list = FlatSource.objects.filter(id_flat=selected_flat.id_flat).order_by('id_source__name')
+            source_list = FlatSource.objects.filter(id_flat=selected_flat.id_flat).select_related('id_source'). \
+                order_by('id_source__name')
             calend = show_calendar(month, year, selected_flat.id_flat)
             return render(request, 'booking/booking_add.html', {"year": year, "month": month, "form": form,
                                                                 "month_name": month_dict[month],
+                                                                "day_names": day_dict.values(),
                                                                 "form1": form1, "discount": discount,
                                                                 "form2": form2, "source_list": source_list,
                                                                 "total_price": tot_price, "calc_type": calc_type,
                                                                 "flat_list": flat_list, "selected_flat": selected_flat,
                                                                 "calendar": calend})
-            # locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
-            # return render(request, 'booking/booking_add.html', {"year": year, "month": month, "form": form,
-            #                                                     "month_name": list(calendar.month_name)[month],
-            #                                                     "form1": form1, "discount": discount,
-            #                                                     "form2": form2, "source_list": source_list,
-            #                                                     "total_price": tot_price, "calc_type": calc_type,
-            #                                                     "flat_list": flat_list, "selected_flat": selected_flat,
-            #                                                     "calendar": calend})
         else:
             raise Http404('У Вас нет доступа')
     return redirect('login')
@@ -549,28 +660,48 @@ def booking_add(request):
 def booking_list(request):
     """
         Booking list view:
-         - Shows the list of bookings
-         - Sorts by: id_booking, checkin_date, id_status
+         - Shows the list of bookings page by page
+         - Sorts by: booking_date, checkin_date, id_status
+         - Filters by status, source and period
     """
     if request.user.is_authenticated:
-        if request.method == "GET":
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-            sort_type = 0
-        else:
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
-            sort_type = int(request.POST['sorttype'])
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
-        if sort_type == 0:
-            book_list = Booking.objects.order_by('-booking_date').filter(id_flat=selected_flat)
-        elif sort_type == 1:
-            book_list = Booking.objects.order_by('-checkin_date').filter(id_flat=selected_flat)
-        elif sort_type == 2:
-            book_list = Booking.objects.order_by('-id_status').filter(id_flat=selected_flat)
-        # gets dictionary with booking-discount
-        disc_dict = calc_booking_discount(book_list, selected_flat.id_flat)
-
-        return render(request, 'booking/booking_list.html', {'book_list': book_list, 'disc_dict': disc_dict,
+        params = request.POST if request.method == "POST" else request.GET
+        if 'sorttype' in params:
+            # the sort form of the old pages posts the sort type as 'sorttype' and its submit button as 'sort'
+            params = params.copy()
+            params['sort'] = params['sorttype']
+        selected_flat = request.flats.selected
+        if not request.flats.owns(selected_flat):
+            raise Http404('У Вас нет доступа')
+        flat_list = request.flats.flat_list
+        filter_form = BookingFilterForm(params)
+        filter_form.is_valid()
+        filters = filter_form.cleaned_data
+        book_list = Booking.objects.filter(id_flat=selected_flat)
+        if filters.get('status'):
+            book_list = book_list.filter(id_status=filters['status'])
+        if filters.get('source'):
+            book_list = book_list.filter(id_source=filters['source'])
+        if filters.get('date_from'):
+            book_list = book_list.filter(checkout_date__gt=filters['date_from'])
+        if filters.get('date_to'):
+            book_list = book_list.filter(checkin_date__lte=filters['date_to'])
+        sort_type = filters.get('sort') or 0
+        try:
+            book_list, next_key = bookings_page(book_list, sort_type, filters.get('after'))
+        except ValueError:
+            raise Http404('Страница не найдена')
+
+        query = {k: v for k, v in filters.items() if v not in (None, '') and k != 'after'}
+        query['flat'] = selected_flat.id_flat
+        next_query = urlencode(dict(query, after=next_key)) if next_key else None
+        first_query = urlencode(query) if filters.get('after') else None
+        status_list = Status.objects.order_by('name')
+        source_list = FlatSource.objects.filter(id_flat=selected_flat.id_flat).select_related('id_source'). \
+            order_by('id_source__name')
+        return render(request, 'booking/booking_list.html', {'book_list': book_list, 'filters': filters,
+                                                            'status_list': status_list, 'source_list': source_list,
+                                                            'next_query': next_query, 'first_query': first_query,
                                                             'flat_list': flat_list, 'selected_flat': selected_flat}, )
     return redirect('login')
 
@@ -585,12 +716,9 @@ def booking_edit(request, booking_id):
          Only landlord of the selected flat can edit a booking
     """
     if request.user.is_authenticated:
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
-        booking = Booking.objects.get(pk=booking_id)
-        if request.method == "GET":
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        if booking.id_flat in flat_list:
+        booking = Booking.objects.select_related('id_status').get(pk=booking_id)
+        selected_flat = request.flats.selected
+        if request.flats.owns(booking.id_flat_id):
             tenant = Tenant.objects.get(booking=booking_id)
             form = BookingForm(request.POST or None, instance=booking)
             form1 = TenantForm(request.POST or None, instance=tenant)
@@ -603,7 +731,6 @@ def booking_edit(request, booking_id):
                 status_list = Status.objects.order_by('name').filter(name__in=['В процессе', 'Отменен'])
 
             if request.method == "POST":
-                selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
                 if "save" in request.POST:
                     start_date = request.POST['checkin_date']
                     end_date = request.POST['checkout_date']
@@ -647,7 +774,9 @@ def booking_edit(request, booking_id):
                         elif status.name == "Ожидается" or status.name == "Завершен":
                             min_nights = Calendar.objects.filter(date=start_date,
                                                                  id_flat=selected_flat.id_flat).values('min_nights_amount')
-                            if (day2 - day1).days >= \
+                            if not min_nights:
+                                messages.success(request, "Даты недоступны")
+                            elif (day2 - day1).days >= \
                                     min_nights[0]['min_nights_amount']:
                                 if period_is_available(start_date, end_date, selected_flat, exc=booking_id):
                                     if day2 <= datetime.datetime.now().date():
@@ -665,7 +794,8 @@ def booking_edit(request, booking_id):
                 if "delete" in request.POST:
                     return booking.delete()
 
-            source_list = FlatSource.objects.filter(id_flat=selected_flat.id_flat).order_by('id_source__name')
+            source_list = FlatSource.objects.filter(id_flat=selected_flat.id_flat).select_related('id_source'). \
+                order_by('id_source__name')
             return render(request, 'booking/booking_edit.html', {'booking': booking, 'form': form, 'form1': form1,
                                                                  "status_list": status_list, "source_list": source_list,
                                                                  "flat_list": [], "selected_flat": selected_flat})
@@ -681,12 +811,9 @@ def booking_delete(request, booking_id):
         - Redirects to the booking list
     """
     if request.user.is_authenticated:
-        selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.filter(id_landlord=landlord.id_landlord_id)
+        selected_flat = request.flats.selected
         booking = Booking.objects.get(pk=booking_id)
-        if booking.id_flat in flat_list:
-            booking = Booking.objects.get(pk=booking_id)
+        if request.flats.owns(booking.id_flat_id):
             booking.delete()
             return HttpResponseRedirect(f'/booking/list?flat={selected_flat.id_flat}')
         else:
@@ -701,11 +828,10 @@ def statistics(request):
          Only the landlord of the selected flat can see the statistics
     """
     if request.user.is_authenticated:
-        selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
+        selected_flat = request.flats.selected
+        flat_list = request.flats.flat_list
         date = datetime.datetime.now().date()
-        if selected_flat in flat_list:
+        if request.flats.owns(selected_flat):
             if request.method == "GET":
                 year = date.year
             else:
@@ -714,97 +840,11 @@ def statistics(request):
                     year += 1
                 elif "prevyear":
                     year -= 1
-            curr_month = date.month
-            curr_year = date.year
-            income = []
-            av_day_price = []
-            load = []
-            booking_number = []
-            av_period = []
-            colors = []
-            dates_in_year_list = Calendar.objects.filter(id_flat=selected_flat.id_flat, date__year=year)
-            for i in range(1, 13):
-                book_list = Booking.objects.filter(id_flat=selected_flat.id_flat)
-                book_list = book_list.filter(Q(checkin_date__month=i, checkin_date__year=year) |
-                                             Q(checkout_date__month=i, checkout_date__year=year)).exclude(id_status=3)
-                disc_dict = calc_booking_discount(book_list, selected_flat.id_flat)
-                dates_list = dates_in_year_list.filter(date__month=i)
-                days_in_month = dates_list.count()
-                income_month = 0
-                busy_days = 0
-                if dates_list:
-                    for date in list(dates_list):
-                        for book in list(book_list):
-                            if book.checkin_date <= date.date < book.checkout_date:
-                                busy_days += 1
-                                income_month += date.base_price * (100 - disc_dict[book.id_booking]) / 100
-                    income.append(income_month)
-                    if busy_days != 0:
-                        av_day_price.append(income_month / busy_days)
-                    else:
-                        av_day_price.append(0)
-                    load.append(int(100 * busy_days / days_in_month))
-                    book_number = len(book_list)
-                    booking_number.append(book_number)
-                    tot_busy_days = 0
-                    for book in list(book_list):
-                        tot_busy_days += (book.checkout_date - book.checkin_date).days
-                    if book_number != 0:
-                        av_period.append(tot_busy_days / book_number)
-                    else:
-                        av_period.append(0)
-                else:
-                    income.append(0)
-                    av_day_price.append(0)
-                    load.append(0)
-                    booking_number.append(0)
-                    av_period.append(0)
-                if (i < curr_month and year == curr_year) or year < curr_year:
-                    colors.append('#528B8B')
-                else:
-                    colors.append('#8B2252')
-
-            book_list_year = Booking.objects.filter(id_flat=selected_flat.id_flat)
-            book_list_year = book_list_year.filter(Q(checkin_date__year=year) | Q(checkout_date__year=year)).exclude(
-                id_status=3)
-            source_dict = {}
-            for book in list(book_list_year):
-                if book.id_source.name not in source_dict.keys():
-                    source_dict[book.id_source.name] = 1
-                else:
-                    source_dict[book.id_source.name] += 1
-
-            months = ['Янв', 'Фев', 'Март', 'Апр', 'Май', 'Июнь', 'Июль',
-                      'Авг', 'Сент', 'Окт', 'Нояб', 'Дек']
-
-            fig_income = go.Figure([go.Bar(x=months, y=income, marker_color=colors)])
-            fig_income.update_layout(title=f'Доход, р. (Общий {sum(income)} р.)', title_x=0.5)
-            fig_avprice = go.Figure([go.Bar(x=months, y=av_day_price, marker_color=colors)])
-            fig_avprice.update_layout(title='Средняя стоимость суток, р.', title_x=0.5)
-            fig_load = go.Figure([go.Bar(x=months, y=load, marker_color=colors)])
-            fig_load.update_layout(title='Загрузка, %', title_x=0.5)
-            fig_booknumber = go.Figure([go.Bar(x=months, y=booking_number, marker_color=colors)])
-            fig_booknumber.update_layout(title=f'Кол-во бронирований, шт. (Общее {len(list(book_list_year))} шт.)',
-                                         title_x=0.5)
-            fig_avperiod = go.Figure([go.Bar(x=months, y=av_period, marker_color=colors)])
-            fig_avperiod.update_layout(title='Средний срок аренды, дн.', title_x=0.5)
-            fig_source = go.Figure(data=[go.Pie(labels=list(source_dict.keys()), values=list(source_dict.values()))])
-            fig_source.update_layout(title='Источники', title_x=0.5)
-            graph_div_income = plotly.offline.plot(fig_income, auto_open=False, output_type="div")
-            graph_div_avprice = plotly.offline.plot(fig_avprice, auto_open=False, output_type="div")
-            graph_div_load = plotly.offline.plot(fig_load, auto_open=False, output_type="div")
-            graph_div_booknumber = plotly.offline.plot(fig_booknumber, auto_open=False, output_type="div")
-            graph_div_avperiod = plotly.offline.plot(fig_avperiod, auto_open=False, output_type="div")
-            graph_div_source = plotly.offline.plot(fig_source, auto_open=False, output_type="div")
-
+            figures = statistics_figures(selected_flat.id_flat, year, date)
             return render(request, 'booking/statistics.html', {"year": year, "flat_list": flat_list,
                                                                "selected_flat": selected_flat,
-                                                               "graph_div_income": graph_div_income,
-                                                               "graph_div_avprice": graph_div_avprice,
-                                                               "graph_div_load": graph_div_load,
-                                                               "graph_div_booknumber": graph_div_booknumber,
-                                                               "graph_div_avperiod": graph_div_avperiod,
-                                                               "graph_div_source": graph_div_source})
+                                                               "figures": figures,
+                                                               "plotly_version": plotly_version()})
         else:
             raise Http404('У Вас нет доступа')
     return redirect('login')
@@ -815,14 +855,12 @@ def settings(request):
         - Shows the list of user's objects
     """
     if request.user.is_authenticated:
-        try:
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        except MultiValueDictKeyError:
+        selected_flat = request.flats.selected
+        if selected_flat is None:
             content = {}
         else:
-            landlord = Landlord.objects.get(id_landlord=request.user.id)
-            flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
-            content = {'flat_list_tot': flat_list, "selected_flat": selected_flat,
+            content = {'flat_list_tot': request.flats.flat_list.prefetch_related('source', 'discount'),
+                       "selected_flat": selected_flat,
                        'open_link': f'http://{request.get_host()}/open_link/',
                        'site_link': f'http://{request.get_host()}/site_link/'}
         return render(request, 'booking/settings.html', content)
@@ -852,17 +890,8 @@ def settings_check_add(request, extra_number, instance, query1, query2, add=0):
     SourceFormSet = modelformset_factory(Source, exclude=('flat',), extra=extra_number)
     form1 = DiscountFormSet(queryset=query1)
     form2 = SourceFormSet(queryset=query2)
-    if request.method == "GET":
-        try:
-            selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        except ValueError:
-            selected_flat = None
+    selected_flat = request.flats.selected
     if request.method == "POST":
-        try:
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
-        except ValueError:
-            selected_flat = None
-
         data1 = {'form-TOTAL_FORMS': extra_number,
                  'form-INITIAL_FORMS': extra_number}
         data2 = {'form-TOTAL_FORMS': extra_number,
@@ -927,19 +956,11 @@ def settings_check_add(request, extra_number, instance, query1, query2, add=0):
                         if form.is_valid():
                             flat_obj = form.save()
                             selected_flat = flat_obj
+                        from dateutil.relativedelta import relativedelta
                         date_0 = datetime.datetime.now().date() - relativedelta(months=1)
                         date_1 = datetime.datetime.now().date() + relativedelta(years=1)
-                        date_inp = date_0
-                        while date_inp < date_1:
-                            data_cal = {'date': date_inp,
-                                        'id_flat': flat_obj.id_flat,
-                                        'base_price': 0,
-                                        'min_nights_amount': 0,
-                                        'is_available': 1}
-                            form_cal = CalendarForm(data_cal)
-                            if form_cal.is_valid():
-                                form_cal.save()
-                            date_inp += datetime.timedelta(days=1)
+                        Calendar.objects.seed(flat_obj, date_0, date_1)
+                        refresh_occupancy(flat_obj, date_0, date_1)
                     else:
                         instance.name = name
                         instance.address = request.POST["address"]
@@ -1003,9 +1024,8 @@ def settings_edit(request, flat_id):
         flat_id(int):  id of the flat to edit
     """
     if request.user.is_authenticated:
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat = Flat.objects.get(pk=flat_id)
-        if flat.id_landlord.id_landlord_id == landlord.id_landlord_id:
+        if request.flats.owns(flat_id):
+            flat = Flat.objects.get(pk=flat_id)
             extra_number = 5
             return settings_check_add(request, extra_number=extra_number, instance=flat,
                                       query1=Discount.objects.filter(flat=flat), query2=Source.objects.filter(flat=flat))
@@ -1022,15 +1042,13 @@ def settings_delete(request, flat_id):
         flat_id(int):  id of the flat to delete
     """
     if request.user.is_authenticated:
-        selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-        landlord = Landlord.objects.get(id_landlord=request.user.id)
-        flat = Flat.objects.get(pk=flat_id)
-        flat_list = Flat.objects.order_by('name').filter(id_landlord=landlord.id_landlord_id)
-        if flat.id_landlord.id_landlord_id == landlord.id_landlord_id:
+        selected_flat = request.flats.selected
+        flat_list = request.flats.flat_list
+        if request.flats.owns(flat_id):
             flat = Flat.objects.get(pk=flat_id)
             deleted_id = flat.id_flat
             flat.delete()
-            if deleted_id == selected_flat.id_flat:
+            if selected_flat is None or deleted_id == selected_flat.id_flat:
                 try:
                     selected_flat = flat_list[0]
                 except IndexError:
@@ -1052,15 +1070,10 @@ def profile_edit(request):
             login(request, cur_user)
             messages.success(request, "Профиль отредактирован")
 
-        if request.method == "GET":
-            try:
-                selected_flat = Flat.objects.get(id_flat=request.GET['flat'])
-            except ValueError:
-                content = {"form": form}
-            else:
-                content = {"selected_flat": selected_flat, "form": form}
-        elif request.method == "POST":
-            selected_flat = Flat.objects.get(id_flat=request.POST['flat'])
+        selected_flat = request.flats.selected
+        if selected_flat is None:
+            content = {"form": form}
+        else:
             content = {"selected_flat": selected_flat, "form": form}
 
         return render(request, 'booking/profile_edit.html', content)
@@ -1103,17 +1116,21 @@ def open_link(request, token):
                     if day2 > day1 >= date:
                         min_nights = Calendar.objects.filter(date=start_date, id_flat=selected_flat.id_flat). \
                             values('min_nights_amount')
-                        if (day2 - day1).days >= min_nights[0]['min_nights_amount']:
-                            if period_is_available(day1, day2, selected_flat):
+                        if not min_nights:
+                            result = 'nonavailable'
+                            messages.success(request, "Даты недоступны")
+                        elif (day2 - day1).days >= min_nights[0]['min_nights_amount']:
+                            availability = FlatAvailability(selected_flat)
+                            if availability.is_available(day1, day2):
                                 tot_price = calculate_price(day1, day2, selected_flat)
                                 discount = check_discount(day1, day2, selected_flat)
                                 price = int(tot_price * (100 - discount) / 100)
                                 result = 'success'
-                                calend = show_calendar(month, year, selected_flat.id_flat)
-                                locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
+                                calend = show_calendar(month, year, selected_flat.id_flat, availability)
                                 return render(request, 'booking/open_link.html',
                                               {"year": year, "month": month,
                                                "month_name": month_dict[month],
+                                               "day_names": day_dict.values(),
                                                "form": form, "result": result, "price": price, "discount": discount,
                                                "tot_price": tot_price, "date": date,
                                                "selected_flat": selected_flat, "calendar": calend})
@@ -1128,17 +1145,95 @@ def open_link(request, token):
                         messages.success(request, "Даты введены неверно")
 
         calend = show_calendar(month, year, selected_flat.id_flat)
-        # locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
         return render(request, 'booking/open_link.html', {"year": year, "month": month,
                                                           "month_name": month_dict[month],
+                                                          "day_names": day_dict.values(),
                                                           "date": date, "form": form, "result": result,
                                                           "selected_flat": selected_flat,
                                                           "calendar": calend})
 
 
+def api_response(request, payload, etag):
+    """
+           JSON response of the public API, shared caches may keep it for AVAILABILITY_MAX_AGE seconds
+           and revalidate it with the ETag afterwards
+    """
+    response = JsonResponse(payload, json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=AVAILABILITY_MAX_AGE)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def api_month(request, token):
+    """
+        Public API: availability and base prices of the flat for the month (?year=&month=, the current month
+        by default, API_YEARS years around the current one). Answers are cached until the calendar or the bookings
+        of the flat are changed
+
+        INPUT
+        ---------
+        token(str):  tenants link token of the flat
+    """
+    flat = get_public_flat(token)
+    if flat is None:
+        return api_error('Объект не найден', status=404)
+    date = datetime.datetime.now().date()
+    try:
+        year = int(request.GET.get('year', date.year))
+        month = int(request.GET.get('month', date.month))
+        if abs(year - date.year) > API_YEARS:
+            raise ValueError(year)
+        weeks, etag = month_availability(flat['id_flat'], year, month)
+    except ValueError:
+        return api_error('Месяц указан неверно')
+    return api_response(request, {'flat': flat['name'], 'year': year, 'month': month,
+                                  'month_name': month_dict[month], 'weeks': weeks}, etag)
+
+
+def api_quote(request, token):
+    """
+        Public API: checks if the period (?start_date=&end_date=) can be booked and calculates
+        its base price, discount and final price
+
+        INPUT
+        ---------
+        token(str):  tenants link token of the flat
+    """
+    flat = get_public_flat(token)
+    if flat is None:
+        return api_error('Объект не найден', status=404)
+    date = datetime.datetime.now().date()
+    form = CheckDataForm(request.GET)
+    if not form.is_valid():
+        return api_error('Даты введены неверно')
+    day1 = form.cleaned_data['start_date']
+    day2 = form.cleaned_data['end_date']
+    if not day2 > day1 >= date or (day2 - day1).days > API_MAX_NIGHTS or day2.year > date.year + API_YEARS:
+        return api_error('Даты введены неверно')
+    answer, etag = quote(flat['id_flat'], day1, day2)
+    return api_response(request, dict(answer, start_date=day1.isoformat(), end_date=day2.isoformat()), etag)
+
+
+def plotly_js(request):
+    """
+        Serves plotly.js for the statistics page. The URL contains the plotly version,
+        so browsers cache the library for a year and download it again only after an upgrade
+    """
+    content, etag = plotly_bundle()
+    response = HttpResponse(content, content_type='application/javascript')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
 def site_link(request, token):
     """
-        Generates a .ical file for the selected flat
+        Generates a .ical file for the selected flat.
+        The file is cached, ETag and Last-Modified headers allow external sites to poll it with conditional requests
 
         INPUT
         ---------
@@ -1150,20 +1245,79 @@ def site_link(request, token):
     except Flat.DoesNotExist:
         raise Http404('Объект не найден')
     else:
-        book_list = Booking.objects.filter(id_flat=selected_flat.id_flat, id_status__in=['2', '4'])
-        cal = icalendar.Calendar()
-        cal.add('prodid', 'FlatRen')
-        cal.add('version', '2.0')
-
-        for book in book_list:
-            event = icalendar.Event()
-            event.add('summary', 'Booked on FlatRent')
-            event.add('dtstart', book.checkin_date)
-            event.add('dtend', book.checkout_date)
-            cal.add_component(event)
-
+        feed = get_ical(selected_flat.id_flat)
         filename = "FlatRent.ics"
-        content = cal.to_ical()
-        response = HttpResponse(content, content_type='text/plain')
+        response = HttpResponse(feed['content'], content_type='text/plain')
         response['Content-Disposition'] = 'attachment; filename={0}'.format(filename)
+        response['ETag'] = feed['etag']
+        response['Last-Modified'] = http_date(feed['last_modified'])
+        # pollers revalidate the calendar every time and get 304 if it is not changed
+        patch_cache_control(response, no_cache=True)
+        return get_conditional_response(request, etag=feed['etag'], last_modified=feed['last_modified'],
+                                        response=response)
+
+
+def export_flats(request):
+    """
+           Flats of the export: the selected flat or all the flats of the landlord if 'all' is set
+
+           OUTPUT
+           ---------------------
+           flats(list): ids of the flats
+           name(str): part of the file name
+    """
+    if 'all' in request.GET:
+        return sorted(request.flats.owned_ids), 'all'
+    selected_flat = request.flats.selected
+    if not request.flats.owns(selected_flat):
+        raise Http404('У Вас нет доступа')
+    return [selected_flat.id_flat], f'flat{selected_flat.id_flat}'
+
+
+def export_csv(rows, filename):
+    """
+           Streams the rows as a CSV file, the rows are generated while the response is sent
+    """
+    response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_bookings(request):
+    """
+        Exports the bookings of the selected flat (?flat=) or of all the flats of the landlord (?all) to CSV:
+        tenant, source, status and discount of every booking
+    """
+    if request.user.is_authenticated:
+        flats, name = export_flats(request)
+        return export_csv(booking_rows(flats), f'bookings_{name}_{datetime.date.today()}.csv')
+    return redirect('login')
+
+
+def export_calendar(request):
+    """
+        Exports the calendar days of the selected flat (?flat=) or of all the flats of the landlord (?all) to CSV
+        together with the occupancy of the days
+    """
+    if request.user.is_authenticated:
+        flats, name = export_flats(request)
+        return export_csv(calendar_rows(flats), f'calendar_{name}_{datetime.date.today()}.csv')
+    return redirect('login')
+
+
+def metrics(request):
+    """
+        Request metrics of the views collected by RequestMetricsMiddleware in the current process:
+        latency histogram, p50/p95/p99 of latency, number of queries, DB and template time.
+        Every worker process keeps its own metrics, the page shows the process that serves the request only.
+        Available only to the staff users, ?format=json returns JSON instead of the text table
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        snapshot = registry.snapshot()
+        if request.GET.get('format') == 'json':
+            response = JsonResponse({'process': os.getpid(), 'views': snapshot})
+        else:
+            response = HttpResponse(metrics_text(snapshot), content_type='text/plain; charset=utf-8')
+        patch_cache_control(response, no_store=True)
         return response
+    raise Http404('Страница не найдена')